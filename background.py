@@ -0,0 +1,81 @@
+""" Running the simulation on a background thread.
+
+The positions for the next frame are computed on a worker thread while the game
+gets on with the rest of its frame. The worker writes them into the back one of
+a pair of buffers, and the next frame swaps the buffers and writes the front
+one into the game, so the buffer being read is never the one being written.
+
+Only one step is ever in flight. The thread running the game hooks waits for it
+before touching the simulation, so the simulation itself needs no locking.
+NumPy releases the GIL in its vectorized loops, which is where the worker
+overlaps with the game.
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import weakref
+
+import numpy as np
+
+
+class SimulationWorker:
+    """ Run simulation steps on a background thread, one at a time. """
+    def __init__(self, step: Callable[[Any], tuple[np.ndarray, int]], capacity: int = 8):
+        # Called on the worker thread with each job. It returns the positions
+        # of the bodies and the index of the body which isn't moved (or -1).
+        self._step = step
+        self._buffers = [np.zeros((capacity, 3)), np.zeros((capacity, 3))]
+        self._front = 0
+        self._future: Optional[Future] = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="newton-simulation")
+        # Stop the thread if this is dropped without being shut down, eg. when
+        # the mod is reloaded.
+        self._finalizer = weakref.finalize(self, self._executor.shutdown, False)
+
+    @property
+    def busy(self) -> bool:
+        return self._future is not None
+
+    def submit(self, job):
+        """ Start computing the next step in the background. """
+        self.wait()
+        self._future = self._executor.submit(self._run, job)
+
+    def _run(self, job) -> int:
+        positions, fixed_index = self._step(job)
+        np.copyto(self._buffers[1 - self._front], positions)
+        return fixed_index
+
+    def wait(self):
+        """ Block until the step in flight (if any) is done. The result is kept
+        for `swap`. Any error raised by the step is raised here.
+        """
+        if self._future is not None:
+            self._future.result()
+
+    def swap(self) -> Optional[tuple[np.ndarray, int]]:
+        """ Wait for the step in flight and make its positions the front
+        buffer. Returns them along with the index of the body which isn't
+        moved, or None if no step was in flight.
+        """
+        if self._future is None:
+            return None
+        future, self._future = self._future, None
+        fixed_index = future.result()
+        self._front = 1 - self._front
+        return self._buffers[self._front], fixed_index
+
+    def discard(self):
+        """ Wait for the step in flight and throw its result away. """
+        if self._future is not None:
+            future, self._future = self._future, None
+            future.exception()
+
+    def resize(self, capacity: int):
+        self.discard()
+        self._buffers = [np.zeros((capacity, 3)), np.zeros((capacity, 3))]
+
+    def shutdown(self):
+        self.discard()
+        self._finalizer.detach()
+        self._executor.shutdown()
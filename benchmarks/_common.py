@@ -0,0 +1,50 @@
+""" Shared helpers for the benchmarks.
+
+The benchmarks run outside of the game, so they build systems of random orbits
+with `generation.generate_orbit_params`, from random seeds and planet radii.
+"""
+
+import os.path as op
+import random
+import sys
+import time
+
+# Make the mod modules importable when running a benchmark directly.
+sys.path.insert(0, op.dirname(op.dirname(op.abspath(__file__))))
+
+from generation import default_globals, generate_orbit_params  # noqa: E402
+from orbits import OrbitEngine, orbitParams  # noqa: E402
+
+
+NEWTON_GLOBALS = default_globals()
+
+
+def random_orbit(rng: random.Random, index: int, is_moon: bool) -> orbitParams:
+    """ Generate the orbit of a body with a random seed (and for moons, a random
+    parent planet radius) as the mod does.
+    """
+    seed = rng.getrandbits(64)
+    parent_planet_radius = rng.uniform(20000, 60000) if is_moon else None
+    return generate_orbit_params(seed, index, is_moon, NEWTON_GLOBALS, parent_planet_radius)
+
+
+def make_system(n_planets: int, n_moons: int, seed: int = 0, **engine_kwargs) -> OrbitEngine:
+    """ Build an orbit engine with the requested number of planets and moons.
+    Moons are distributed round-robin among the planets.
+    """
+    rng = random.Random(seed)
+    engine = OrbitEngine(n_planets + n_moons, **engine_kwargs)
+    for i in range(n_planets):
+        engine.set_body(i, random_orbit(rng, i, False), -1)
+    for i in range(n_moons):
+        engine.set_body(n_planets + i, random_orbit(rng, n_planets + i, True), i % n_planets)
+    return engine
+
+
+def time_per_call(func, repeats: int = 2000) -> float:
+    """ Return the mean time taken by `func()` in microseconds. """
+    func()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1e6
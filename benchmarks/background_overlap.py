@@ -0,0 +1,58 @@
+""" Measure how much of a frame's simulation the background worker hides.
+
+Each frame the "game" does some work of its own (sleeping, which releases the
+GIL like the game's native code does) and the simulation is stepped either in
+the hook on the main thread or on the worker while the game works. This
+reports the time the hook itself takes per frame in each case.
+
+    python benchmarks/background_overlap.py
+"""
+
+import argparse
+import time
+
+from _common import make_system
+from background import SimulationWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=60.0, help="Frame rate.")
+    parser.add_argument("--frames", type=int, default=300, help="Frames to run.")
+    parser.add_argument("--game-ms", type=float, default=5.0, help="Time the game spends per frame.")
+    args = parser.parse_args()
+
+    delta = 1 / args.fps
+    print(f"{'bodies':>7} {'inline us':>10} {'background us':>14}")
+    for n_planets, n_moons in ((6, 2), (50, 450), (100, 1900), (200, 7800)):
+        engine = make_system(n_planets, n_moons, seed=1)
+
+        def step(job):
+            engine.advance(job)
+            return engine.evaluate((0.0, 0.0, 0.0)), -1
+
+        step(delta)
+        inline = 0.0
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            step(delta)
+            inline += time.perf_counter() - start
+            time.sleep(args.game_ms / 1000)
+
+        worker = SimulationWorker(step, engine.capacity)
+        background = 0.0
+        for _ in range(args.frames):
+            start = time.perf_counter()
+            worker.swap()
+            worker.submit(delta)
+            background += time.perf_counter() - start
+            time.sleep(args.game_ms / 1000)
+        worker.shutdown()
+        print(
+            f"{n_planets + n_moons:>7} {inline / args.frames * 1e6:>10.1f} "
+            f"{background / args.frames * 1e6:>14.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
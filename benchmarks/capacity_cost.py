@@ -0,0 +1,78 @@
+""" Measure the cost of growing the body storage of the orbit engine.
+
+Systems of a few planets and hundreds of small (asteroid sized) moons are built
+twice: once in an engine preallocated for every body, and once in an engine
+which starts with the default 8 slots and is grown as the bodies are added, as
+happens in game. For each size this reports how long it took to register all
+the bodies, the time of one frame (advance + evaluate) of each engine, the time
+of a single growth at that size, and that both engines give the same positions.
+
+    python benchmarks/capacity_cost.py
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from _common import random_orbit, time_per_call
+from orbits import OrbitEngine
+
+
+def build(n_planets: int, n_moons: int, capacity: int, seed: int = 0) -> tuple[OrbitEngine, float, int]:
+    """ Register the bodies one at a time, growing the engine when needed.
+    Returns the engine, the time taken in milliseconds and how often it grew.
+    """
+    rng = random.Random(seed)
+    engine = OrbitEngine(capacity)
+    growths = 0
+    start = time.perf_counter()
+    for i in range(n_planets + n_moons):
+        growths += engine.ensure_capacity(i + 1)
+        if i < n_planets:
+            engine.set_body(i, random_orbit(rng, i, False), -1)
+        else:
+            engine.set_body(i, random_orbit(rng, i, True), i % n_planets)
+    return engine, (time.perf_counter() - start) * 1e3, growths
+
+
+def frame(engine, delta, center):
+    engine.advance(delta)
+    engine.evaluate(center)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=60.0, help="Frame rate.")
+    parser.add_argument("--planets", type=int, default=6, help="Number of planets in each system.")
+    args = parser.parse_args()
+
+    delta = 1 / args.fps
+    center = np.zeros(3)
+
+    print(
+        f"{'bodies':>7} {'capacity':>9} {'growths':>8} {'build ms':>9} {'prealloc ms':>12} "
+        f"{'frame us':>9} {'prealloc us':>12} {'grow us':>8} {'max diff m':>11}"
+    )
+    for n_moons in (50, 200, 500, 1000):
+        n = args.planets + n_moons
+        grown, build_ms, growths = build(args.planets, n_moons, 8)
+        preallocated, prealloc_ms, _ = build(args.planets, n_moons, n)
+        for _ in range(60):
+            for engine in (grown, preallocated):
+                frame(engine, delta, center)
+        diff = np.abs(grown.positions[:n] - preallocated.positions).max()
+        frame_us = time_per_call(lambda: frame(grown, delta, center))
+        prealloc_us = time_per_call(lambda: frame(preallocated, delta, center))
+        # A growth from the capacity this size of system ends up with.
+        grow_us = time_per_call(lambda: OrbitEngine(grown.capacity).ensure_capacity(grown.capacity + 1), 200)
+        grow_us -= time_per_call(lambda: OrbitEngine(grown.capacity), 200)
+        print(
+            f"{n:>7} {grown.capacity:>9} {growths:>8} {build_ms:>9.2f} {prealloc_ms:>12.2f} "
+            f"{frame_us:>9.2f} {prealloc_us:>12.2f} {grow_us:>8.1f} {diff:>11.3g}"
+        )
+
+
+if __name__ == "__main__":
+    main()
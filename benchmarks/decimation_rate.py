@@ -0,0 +1,63 @@
+""" Count how many bodies are written to the game each frame with decimation.
+
+A viewer is placed just above the first planet and the system is run for a
+number of frames. For each system size this reports how many bodies were
+written per frame on average and at most, how far (in pixels at the given
+resolution and field of view) any body lagged its true position, and the cost
+of scheduling a frame.
+
+    python benchmarks/decimation_rate.py
+"""
+
+import argparse
+import math
+
+import numpy as np
+
+from _common import make_system, time_per_call
+from decimation import UpdateScheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=60.0, help="Frame rate.")
+    parser.add_argument("--time-rate", type=float, default=1.0, help="Newton time rate.")
+    parser.add_argument("--frames", type=int, default=1200, help="Frames to run each system for.")
+    parser.add_argument("--threshold", type=float, default=2e-4, help="Decimation threshold in radians.")
+    parser.add_argument("--fov", type=float, default=75.0, help="Horizontal field of view in degrees.")
+    parser.add_argument("--width", type=int, default=1920, help="Horizontal resolution in pixels.")
+    args = parser.parse_args()
+
+    delta = args.time_rate / args.fps
+    pixel = math.radians(args.fov) / args.width
+    center = np.zeros(3)
+
+    print(f"{'bodies':>7} {'mean writes':>12} {'max writes':>11} {'max lag px':>11} {'schedule us':>12}")
+    for n_planets, n_moons in ((6, 2), (20, 80), (50, 450), (100, 900)):
+        engine = make_system(n_planets, n_moons, seed=1)
+        scheduler = UpdateScheduler(engine.capacity, args.threshold)
+        indexes = engine.body_indexes
+        written = engine.evaluate(center).copy()
+        writes = []
+        max_lag = 0.0
+        for _ in range(args.frames):
+            engine.advance(delta)
+            positions = engine.evaluate(center)
+            viewer = positions[0] + (0.0, 0.0, 5000.0)
+            selected = scheduler.select(indexes, positions, written, viewer, 0)
+            written[selected] = positions[selected]
+            writes.append(len(selected))
+            a = written[indexes] - viewer
+            b = positions[indexes] - viewer
+            lag = np.linalg.norm(np.cross(a, b), axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+            max_lag = max(max_lag, float(lag.max()))
+        viewer = positions[0] + (0.0, 0.0, 5000.0)
+        cost = time_per_call(lambda: scheduler.select(indexes, positions, written, viewer, 0))
+        print(
+            f"{len(indexes):>7} {np.mean(writes):>12.2f} {max(writes):>11} "
+            f"{max_lag / pixel:>11.3f} {cost:>12.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
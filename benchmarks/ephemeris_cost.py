@@ -0,0 +1,67 @@
+""" Compare evaluating orbits from ephemeris tables against the orbit models.
+
+For each system size and orbit model this reports the time of one frame
+(advance + evaluate) with and without an ephemeris table, along with the
+table size and the largest position error of the interpolation. The compiled
+kernels are used if numba is installed, unless `--no-kernels` is given.
+
+    python benchmarks/ephemeris_cost.py --budget-kib 4096
+"""
+
+import argparse
+
+import numpy as np
+
+from _common import make_system, time_per_call
+from ephemeris import EphemerisTable
+from orbits import INTEGRATION_CLOSED_FORM, INTEGRATION_KEPLERIAN
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=60.0, help="Frame rate.")
+    parser.add_argument("--time-rate", type=float, default=1.0, help="Newton time rate.")
+    parser.add_argument("--planets", type=int, default=6)
+    parser.add_argument("--budget-kib", type=int, default=4096, help="Ephemeris memory budget.")
+    parser.add_argument("--max-samples", type=int, default=512)
+    parser.add_argument("--no-kernels", action="store_true", help="Only use NumPy.")
+    args = parser.parse_args()
+
+    delta = args.time_rate / args.fps
+    center = (0.0, 0.0, 0.0)
+
+    print(f"{'bodies':>8} {'model':>12} {'direct (us)':>12} {'table (us)':>11} {'table KiB':>10} {'max error (m)':>14}")
+    for n_moons in (4, 100, 1000, 10000):
+        for mode in (INTEGRATION_CLOSED_FORM, INTEGRATION_KEPLERIAN):
+            engine = make_system(args.planets, n_moons, integration_mode=mode)
+            engine.use_kernels = engine.use_kernels and not args.no_kernels
+            table = EphemerisTable.build(engine, args.budget_kib * 1024, args.max_samples)
+            if table is None:
+                print(f"{args.planets + n_moons:8d} {mode:>12} does not fit in the budget")
+                continue
+
+            def frame():
+                engine.advance(delta)
+                engine.evaluate(center)
+
+            direct = time_per_call(frame)
+            engine.ephemeris = table
+            tabled = time_per_call(frame)
+
+            # Compare the two over a full period of the slowest body.
+            error = 0.0
+            step = table.period.max() / 500
+            for _ in range(500):
+                engine.advance(step)
+                engine.ephemeris = None
+                expected = engine.evaluate(center).copy()
+                engine.ephemeris = table
+                error = max(error, float(np.abs(engine.evaluate(center) - expected).max()))
+            print(
+                f"{args.planets + n_moons:8d} {mode:>12} {direct:12.2f} {tabled:11.2f} "
+                f"{table.nbytes / 1024:10.1f} {error:14.4g}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+""" Compare the incremental phase integration against the closed form.
+
+Both engines are advanced with the same (jittered) frame times over a long
+simulated session, and the largest positional error of the incremental engine
+is reported at regular checkpoints, along with the cost of one frame of each.
+
+    python benchmarks/incremental_drift.py --hours 4 --time-rate 10
+"""
+
+import argparse
+import random
+
+import numpy as np
+
+from _common import make_system, time_per_call
+from orbits import INTEGRATION_CLOSED_FORM, INTEGRATION_INCREMENTAL
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=2.0, help="Length of the simulated session.")
+    parser.add_argument("--fps", type=float, default=60.0, help="Mean frame rate.")
+    parser.add_argument("--time-rate", type=float, default=1.0, help="Newton time rate.")
+    parser.add_argument("--planets", type=int, default=6)
+    parser.add_argument("--moons", type=int, default=4)
+    parser.add_argument("--renormalize-interval", type=int, default=64)
+    parser.add_argument("--checkpoints", type=int, default=8)
+    args = parser.parse_args()
+
+    closed = make_system(args.planets, args.moons, integration_mode=INTEGRATION_CLOSED_FORM)
+    incremental = make_system(args.planets, args.moons, integration_mode=INTEGRATION_INCREMENTAL)
+    incremental.renormalize_interval = args.renormalize_interval
+    center = (0.0, 0.0, 0.0)
+
+    frames = int(args.hours * 3600 * args.fps)
+    checkpoint_every = max(frames // args.checkpoints, 1)
+    rng = random.Random(1)
+    mean_dt = 1 / args.fps
+
+    print(f"Simulating {frames} frames ({args.hours} h at {args.fps} fps, time rate {args.time_rate})")
+    print(f"{'sim time (h)':>12} {'max error (m)':>14} {'max rel error':>14}")
+    for frame in range(1, frames + 1):
+        delta = args.time_rate * mean_dt * rng.uniform(0.5, 1.5)
+        closed.advance(delta)
+        incremental.advance(delta)
+        if frame % checkpoint_every == 0 or frame == frames:
+            # Only the positions are compared; the closed form is the reference.
+            expected = closed.evaluate(center).copy()
+            actual = incremental.evaluate(center)
+            error = np.linalg.norm(actual - expected, axis=1)
+            rel_error = error / np.maximum(closed.a, 1)
+            hours = frame * mean_dt / 3600
+            print(f"{hours:12.2f} {error.max():14.6g} {rel_error.max():14.6g}")
+
+    print()
+    print(f"{'bodies':>8} {'closed form (us)':>17} {'incremental (us)':>17}")
+    delta = args.time_rate * mean_dt
+    for n_moons in (args.moons, 100, 1000, 10000):
+        timings = []
+        for mode in (INTEGRATION_CLOSED_FORM, INTEGRATION_INCREMENTAL):
+            engine = make_system(args.planets, n_moons, integration_mode=mode)
+
+            def frame():
+                engine.advance(delta)
+                engine.evaluate(center)
+
+            timings.append(time_per_call(frame))
+        print(f"{args.planets + n_moons:8d} {timings[0]:17.2f} {timings[1]:17.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+""" Compare the cost of the Keplerian orbit model against the parametric one.
+
+For each system size this reports the time of one frame (advance + evaluate)
+with the existing parametric closed form, and with the Keplerian model using a
+warm-started solver for 1 and 2 iterations as well as a cold solve every frame.
+The largest residual of Kepler's equation after the frame is also reported.
+
+    python benchmarks/kepler_cost.py --time-rate 10
+"""
+
+import argparse
+
+import numpy as np
+
+from _common import make_system, time_per_call
+from orbits import INTEGRATION_CLOSED_FORM, INTEGRATION_KEPLERIAN
+
+
+def kepler_residual(engine) -> float:
+    E = engine._ecc_anomaly
+    return float(np.abs(E - engine.e * np.sin(E) - engine._phase).max())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=60.0, help="Frame rate.")
+    parser.add_argument("--time-rate", type=float, default=1.0, help="Newton time rate.")
+    parser.add_argument("--planets", type=int, default=6)
+    parser.add_argument("--warmup-frames", type=int, default=600)
+    args = parser.parse_args()
+
+    delta = args.time_rate / args.fps
+    center = (0.0, 0.0, 0.0)
+    configs = [
+        ("parametric", INTEGRATION_CLOSED_FORM, None),
+        ("kepler warm x1", INTEGRATION_KEPLERIAN, 1),
+        ("kepler warm x2", INTEGRATION_KEPLERIAN, 2),
+        ("kepler cold", INTEGRATION_KEPLERIAN, None),
+    ]
+
+    print(f"{'bodies':>8} {'model':>16} {'frame (us)':>11} {'residual':>10}")
+    for n_moons in (4, 100, 1000, 10000):
+        for name, mode, iterations in configs:
+            engine = make_system(args.planets, n_moons, integration_mode=mode)
+            if iterations is not None:
+                engine.kepler_iterations = iterations
+
+            def frame():
+                if name == "kepler cold":
+                    # Throw away the previous solution to force a cold start.
+                    engine._anomaly_dirty = True
+                engine.advance(delta)
+                engine.evaluate(center)
+
+            for _ in range(args.warmup_frames):
+                frame()
+            cost = time_per_call(frame)
+            residual = kepler_residual(engine) if mode == INTEGRATION_KEPLERIAN else 0.0
+            print(f"{args.planets + n_moons:8d} {name:>16} {cost:11.2f} {residual:10.2g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+""" Compare the compiled kernels against the NumPy implementation.
+
+For each system size this reports the time of one frame (advance + evaluate)
+of the closed form orbits with and without the kernels, along with the time of
+one evaluation of the approach rate curve. It also checks that the kernels give
+identical results whether they are compiled or run as plain Python, and how far
+they are from the NumPy implementation.
+
+    python benchmarks/kernel_cost.py
+"""
+
+import argparse
+
+import numpy as np
+
+from _common import make_system, time_per_call
+import kernels
+
+
+def frame(engine, delta, center, fixed_position):
+    engine.advance(delta)
+    engine.evaluate(center, 0, fixed_position)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=60.0, help="Frame rate.")
+    parser.add_argument("--time-rate", type=float, default=1.0, help="Newton time rate.")
+    parser.add_argument("--frames", type=int, default=600, help="Frames to compare the results over.")
+    args = parser.parse_args()
+
+    if not kernels.HAS_NUMBA:
+        print("numba is not installed so the kernels are running as plain Python.")
+
+    delta = args.time_rate / args.fps
+    center = (1e5, -2e5, 3e5)
+    fixed_position = (1.0, 2.0, 3.0)
+
+    print(f"{'bodies':>8} {'numpy us':>10} {'kernels us':>11} {'speedup':>8} {'max diff m':>11}")
+    for n_planets, n_moons in ((6, 2), (50, 50), (500, 500)):
+        engines = {}
+        for use_kernels in (False, True):
+            engine = make_system(n_planets, n_moons, seed=1)
+            engine.orientation[:] = np.linalg.qr(np.random.default_rng(1).normal(size=(len(engine.a), 3, 3)))[0]
+            engine._rebuild_groups()
+            engine.use_kernels = use_kernels
+            engines[use_kernels] = engine
+        for _ in range(args.frames):
+            for engine in engines.values():
+                frame(engine, delta, center, fixed_position)
+        diff = np.abs(engines[False].positions - engines[True].positions).max()
+        timings = [
+            time_per_call(lambda engine=engine: frame(engine, delta, center, fixed_position))
+            for engine in engines.values()
+        ]
+        print(
+            f"{n_planets + n_moons:>8} {timings[0]:>10.2f} {timings[1]:>11.2f} "
+            f"{timings[0] / timings[1]:>7.2f}x {diff:>11.3g}"
+        )
+
+    # The compiled kernels must match running them as plain Python exactly.
+    engine = make_system(50, 50, seed=2)
+    engine.advance(1234.5)
+    compiled = np.zeros((100, 3))
+    python = np.zeros((100, 3))
+    kernels.closed_form_offsets(engine.a, engine.b, engine.alpha, engine.delta, engine.times, compiled)
+    kernels.closed_form_offsets.py_func(engine.a, engine.b, engine.alpha, engine.delta, engine.times, python)
+    print(f"closed form offsets identical when compiled: {np.array_equal(compiled, python)}")
+    dists = np.linspace(0, 200, 20001)
+    rates = [kernels.approach_rate(d, 30.0, 150.0, 3.0) for d in dists.tolist()]
+    py_rates = [kernels.approach_rate.py_func(d, 30.0, 150.0, 3.0) for d in dists.tolist()]
+    print(f"approach rates identical when compiled: {rates == py_rates}")
+    print(
+        f"approach rate: {time_per_call(lambda: kernels.approach_rate(80.0, 30.0, 150.0, 3.0), 100000):.3f} us compiled, "
+        f"{time_per_call(lambda: kernels.approach_rate.py_func(80.0, 30.0, 150.0, 3.0), 100000):.3f} us plain Python"
+    )
+
+
+if __name__ == "__main__":
+    main()
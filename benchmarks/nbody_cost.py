@@ -0,0 +1,59 @@
+""" Measure the cost of an N-body integrator step against the body count.
+
+The pairwise acceleration is O(n^2) in both time and memory, so this reports
+the cost of a single leapfrog step for increasing numbers of bodies, along with
+the relative energy drift over a simulated hour, to show where the engine stops
+being viable inside the per-frame hook.
+
+    python benchmarks/nbody_cost.py --frame-budget-ms 1.0
+"""
+
+import argparse
+import math
+
+import numpy as np
+
+from _common import make_system, time_per_call
+from nbody import NBodyEngine
+from orbits import STAR_MU
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--planets", type=int, default=6)
+    parser.add_argument("--planet-mass-ratio", type=float, default=0.02)
+    parser.add_argument("--moon-mass-ratio", type=float, default=1e-4)
+    parser.add_argument("--max-step", type=float, default=2.0, help="Integrator step in seconds.")
+    parser.add_argument("--frame-budget-ms", type=float, default=1.0, help="Budget for one step per frame.")
+    args = parser.parse_args()
+
+    print(f"{'bodies':>8} {'step (us)':>10} {'energy drift (1h)':>18}")
+    viable = 0
+    for n_moons in (4, 24, 94, 194, 394, 794, 1594):
+        engine = make_system(args.planets, n_moons)
+        mu = np.zeros(engine.capacity)
+        mu[engine.planet_indexes] = STAR_MU * args.planet_mass_ratio
+        mu[engine.moon_indexes] = STAR_MU * args.moon_mass_ratio
+        nbody = NBodyEngine.from_orbit_engine(engine, STAR_MU, mu, max_step=args.max_step)
+
+        cost = time_per_call(lambda: nbody.step(args.max_step), repeats=max(10, 20000 // nbody.body_count))
+        # Simulate an hour to check the energy drift.
+        nbody = NBodyEngine.from_orbit_engine(engine, STAR_MU, mu, max_step=args.max_step)
+        initial_energy = nbody.energy()
+        steps = math.ceil(3600 / args.max_step)
+        if cost * steps < 60e6:
+            for _ in range(steps):
+                nbody.step(args.max_step)
+            drift = f"{(nbody.energy() - initial_energy) / abs(initial_energy):18.3g}"
+        else:
+            drift = f"{'(skipped)':>18}"
+        print(f"{nbody.body_count:8d} {cost:10.1f} {drift}")
+        if cost < args.frame_budget_ms * 1000:
+            viable = nbody.body_count
+
+    print()
+    print(f"Largest system with one step under {args.frame_budget_ms} ms: {viable} bodies")
+
+
+if __name__ == "__main__":
+    main()
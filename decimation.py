@@ -0,0 +1,92 @@
+""" Scheduling of the writes of body positions to the game.
+
+Computing where every body is costs little with the vectorized engine, but
+writing a body's position to the game shifts every transform in its node tree.
+Bodies far from the player barely move on screen from one frame to the next,
+so they are only written once they have moved far enough as seen from the
+player. A body moving across the sky at angular speed `w` per frame is then
+written every `threshold / w` frames: the nearest bodies every frame and the
+distant ones every few frames.
+
+A body is written at its exact position whenever it is written, so (unless more
+bodies are due in a frame than may be written) it only ever lags where it
+should be by less than the threshold and nothing needs to be interpolated
+between writes.
+"""
+
+import numpy as np
+
+from orbits import grow_array
+
+
+class UpdateScheduler:
+    """ Choose which bodies to write to the game each frame. """
+    def __init__(
+        self,
+        capacity: int = 8,
+        threshold: float = 2e-4,
+        max_interval: int = 30,
+        max_updates: int = 4,
+    ):
+        # Angle in radians a body may move through as seen from the player
+        # before it is written again.
+        self.threshold = threshold
+        # A body which has moved at all is written at least this often (in
+        # frames).
+        self.max_interval = max_interval
+        # At most this many bodies are written each frame, besides the one
+        # which is always written. The rest are written on later frames.
+        self.max_updates = max_updates
+        # Frames since each body was last written.
+        self.age = np.zeros(capacity, dtype=np.intp)
+        # Totals of the bodies written and skipped.
+        self.updates = 0
+        self.skipped = 0
+
+    def grow(self, capacity: int):
+        """ Make room for `capacity` bodies, keeping their ages. """
+        if capacity > len(self.age):
+            self.age = grow_array(self.age, capacity)
+
+    def reset(self):
+        self.age[:] = 0
+        self.updates = 0
+        self.skipped = 0
+
+    def select(
+        self,
+        indexes: np.ndarray,
+        positions: np.ndarray,
+        written: np.ndarray,
+        viewer,
+        always: int = -1,
+    ) -> np.ndarray:
+        """ Return which of the bodies in `indexes` to write this frame, given
+        their new `positions` and the positions they were last `written` at,
+        as seen from `viewer`. The body `always` is always written. The bodies
+        returned are counted as written.
+        """
+        a = written[indexes] - viewer
+        b = positions[indexes] - viewer
+        # Angle each body has moved through as seen from the viewer since it
+        # was last written. This is tiny so the sine of it is as good.
+        error = np.linalg.norm(np.cross(a, b), axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            error /= np.sqrt(np.einsum("ij,ij->i", a, a) * np.einsum("ij,ij->i", b, b))
+        # A body at the viewer is as far out as it can be.
+        error[np.isnan(error)] = np.inf
+        self.age[indexes] += 1
+        age = self.age[indexes]
+        due = (error >= self.threshold) | ((age >= self.max_interval) & (error > 0))
+        forced = indexes == always
+        due &= ~forced
+        chosen = np.flatnonzero(due)
+        if len(chosen) > self.max_updates:
+            # Write the bodies which are the furthest behind first.
+            priority = error[chosen] / self.threshold + age[chosen] / self.max_interval
+            chosen = chosen[np.argsort(-priority)[:self.max_updates]]
+        selected = np.concatenate([indexes[forced], indexes[chosen]])
+        self.age[selected] = 0
+        self.updates += len(selected)
+        self.skipped += len(indexes) - len(selected)
+        return selected
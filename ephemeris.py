@@ -0,0 +1,190 @@
+""" Precomputed ephemeris tables for the orbit engine.
+
+Each body's orbit (relative to its parent) is sampled at a number of points
+per period, and the cubic Hermite interpolant between each pair of samples is
+stored as the coefficients of a polynomial in compact float32 arrays.
+Evaluating a position is then a table lookup plus a cubic polynomial, which is
+much cheaper than the more expensive orbit models.
+"""
+
+import math
+from typing import Optional
+
+import numpy as np
+
+from kernels import ephemeris_offsets
+from orbits import OrbitEngine, sample_orbits
+
+
+# Each sample holds the 4 coefficients of a cubic as 3 float32's each.
+BYTES_PER_SAMPLE = 4 * 3 * np.dtype(np.float32).itemsize
+
+
+def allocate_samples(
+    periods: np.ndarray,
+    budget_bytes: int,
+    max_samples: int = 1024,
+    min_samples: int = 64,
+) -> Optional[np.ndarray]:
+    """ Determine how many samples each body gets.
+
+    The shortest period orbit gets `max_samples` and longer period orbits get
+    fewer, proportionally to `sqrt(shortest_period / period)`. If the total is
+    over budget then every body is scaled down uniformly, but never below
+    `min_samples`. Returns None if even that cannot fit within the budget.
+    """
+    if len(periods) == 0:
+        return np.zeros(0, dtype=np.intp)
+    # Leave room for the zero sample at the start of the table.
+    budget_samples = budget_bytes // BYTES_PER_SAMPLE - 1
+    if min_samples * len(periods) > budget_samples:
+        return None
+    wanted = max_samples * np.sqrt(periods.min() / periods)
+    scale = 1.0
+    # Each pass either fits or holds at least one more body at the minimum.
+    for _ in range(len(periods) + 1):
+        counts = np.clip(np.floor(wanted * scale), min_samples, max_samples)
+        if counts.sum() <= budget_samples:
+            break
+        # Only the bodies above the minimum can give up samples.
+        free = counts > min_samples
+        left = budget_samples - min_samples * np.count_nonzero(~free)
+        scale *= left / counts[free].sum()
+    return counts.astype(np.intp)
+
+
+class EphemerisTable:
+    """ Sampled orbits of every body in an `OrbitEngine`.
+
+    The samples for all bodies are stored back to back in a single table of
+    shape `(4, n_samples, 3)`. Each sample holds the coefficients of the cubic
+    from it to the next sample for each axis, in powers of the fraction of the
+    way between them, with each power in a contiguous block of its own. Index 0
+    of the table is a zero sample which bodies without an orbit point at so
+    that every body can be evaluated in the same batched operation.
+    """
+    def __init__(
+        self,
+        integration_mode: str,
+        samples: np.ndarray,
+        start: np.ndarray,
+        count: np.ndarray,
+        period: np.ndarray,
+    ):
+        self.integration_mode = integration_mode
+        self.samples = samples
+        self.start = start
+        self.count = count
+        self.period = period
+        # Time between samples, and its reciprocal.
+        with np.errstate(divide="ignore"):
+            self.step = np.where(count > 0, period / np.maximum(count, 1), 0)
+            self.sample_rate = np.where(self.step > 0, 1 / self.step, 0)
+        # Orbits per unit of time.
+        self._orbit_rate = np.where(period > 0, 1 / np.where(period > 0, period, 1), 0)
+        # Bodies without samples use the single sample at index 0.
+        self._count = np.maximum(count, 1).astype(np.float64)
+        self._last = self._count - 1
+
+        n = len(start)
+        self._u = np.zeros(n)
+        self._k = np.zeros(n)
+        self._index = np.zeros(n, dtype=np.intp)
+        self._c = np.zeros((4, n, 3), dtype=np.float32)
+        self._w = np.zeros((n, 3))
+        # Flat views of the above, so the cubics are evaluated as one long loop
+        # per operation rather than many of length 3.
+        self._c_flat = [c.reshape(-1) for c in self._c]
+        self._w_flat = self._w.reshape(-1)
+
+    @property
+    def nbytes(self) -> int:
+        return self.samples.nbytes
+
+    @classmethod
+    def build(
+        cls,
+        engine: OrbitEngine,
+        budget_bytes: int,
+        max_samples: int = 1024,
+        min_samples: int = 64,
+    ) -> Optional["EphemerisTable"]:
+        """ Sample the orbits of every active body in the engine. Returns None
+        if the orbits cannot fit within the memory budget.
+        """
+        active = np.flatnonzero(engine.active & (engine.alpha > 0))
+        periods = math.tau / engine.alpha[active]
+        counts = allocate_samples(periods, budget_bytes, max_samples, min_samples)
+        if counts is None:
+            return None
+
+        count = np.zeros(engine.capacity, dtype=np.intp)
+        count[active] = counts
+        start = np.zeros(engine.capacity, dtype=np.intp)
+        # Offset everything by one to leave the zero sample at the start.
+        start[active] = 1 + np.cumsum(counts) - counts
+        period = np.zeros(engine.capacity)
+        period[active] = periods
+
+        # Sample times of all the bodies, back to back.
+        body = np.repeat(active, counts)
+        sample = np.arange(len(body)) - np.repeat(start[active] - 1, counts)
+        t = sample * np.repeat(periods / counts, counts)
+        pos, vel = sample_orbits(
+            engine.integration_mode,
+            engine.a[body],
+            engine.b[body],
+            engine.alpha[body],
+            engine.delta[body],
+            engine.e[body],
+            t,
+        )
+        # Each sample is followed by the next one along the same orbit.
+        following = np.arange(1, len(body) + 1)
+        last = sample == np.repeat(counts, counts) - 1
+        following[last] -= np.repeat(counts, counts)[last]
+        # The Hermite interpolant between the samples as a cubic.
+        h = np.repeat(periods / counts, counts)[:, None]
+        p0, p1 = pos, pos[following]
+        v0, v1 = h * vel, h * vel[following]
+        samples = np.zeros((4, len(body) + 1, 3), dtype=np.float32)
+        samples[0, 1:] = p0
+        samples[1, 1:] = v0
+        samples[2, 1:] = 3 * (p1 - p0) - 2 * v0 - v1
+        samples[3, 1:] = 2 * (p0 - p1) + v0 + v1
+        return cls(engine.integration_mode, samples, start, count, period)
+
+    def evaluate(self, times: np.ndarray, out: np.ndarray, use_kernels: bool = False):
+        """ Interpolate the position of every body at the given times into `out`. """
+        if use_kernels:
+            ephemeris_offsets(self.samples, self.start, self._count, self._orbit_rate, times, out)
+            return
+        u, k = self._u, self._k
+        # Fraction of the way around the orbit, then the position along it
+        # measured in samples and the sample before it.
+        # (np.remainder is much slower than doing the reduction by hand.)
+        np.multiply(times, self._orbit_rate, out=u)
+        np.floor(u, out=k)
+        u -= k
+        u *= self._count
+        np.floor(u, out=k)
+        # Guard against rounding putting us exactly at the end of the orbit,
+        # before taking the fraction so that it lands at the end of the last
+        # segment (as in the kernel).
+        np.minimum(k, self._last, out=k)
+        u -= k
+        np.add(self.start, k, out=self._index, casting="unsafe")
+
+        # Evaluate the cubics by Horner's method.
+        for samples, c in zip(self.samples, self._c):
+            np.take(samples, self._index, axis=0, out=c)
+        np.copyto(self._w, u[:, None])
+        w = self._w_flat
+        c0, c1, c2, c3 = self._c_flat
+        acc = out.reshape(-1)
+        np.multiply(c3, w, out=acc)
+        acc += c2
+        acc *= w
+        acc += c1
+        acc *= w
+        acc += c0
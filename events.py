@@ -0,0 +1,272 @@
+""" Prediction of upcoming events in a solar system.
+
+Rather than searching for events every frame, the orbits are sampled ahead of
+time and any events found are kept in heaps ordered by when they occur. The
+predictions are extended a fraction of the window each frame so that no one
+frame pays for the whole window, and there is a heap for each kind of event and
+each body as well as the overall one, so checking for the next event is almost
+free.
+
+Events are predicted assuming every body runs at the full rate. If a body is
+slowed down (because the player is near it) the predictions are redone once it
+has fallen far enough behind.
+"""
+
+from collections import namedtuple
+import heapq
+import itertools
+import math
+from typing import Iterator, Optional
+
+import numpy as np
+
+from orbits import OrbitEngine, sample_orbits
+
+
+# A moon passes closest to a planet other than the one it orbits.
+EVENT_CLOSEST_APPROACH = "closest_approach"
+# Two planets line up as seen from the star.
+EVENT_ALIGNMENT = "alignment"
+# A body passes in front of the star as seen from the observer body.
+EVENT_ECLIPSE = "eclipse"
+EVENT_KINDS = (EVENT_CLOSEST_APPROACH, EVENT_ALIGNMENT, EVENT_ECLIPSE)
+
+# `epoch` is the orbit engine epoch at which the event happens, and `value` is
+# the separation at that time (a distance for closest approaches and an angle in
+# radians otherwise).
+orbitEvent = namedtuple("orbitEvent", ["epoch", "kind", "first", "second", "value"])
+
+
+def format_duration(seconds: float) -> str:
+    """ Format a duration compactly, eg. "45s", "3m" or "2h 5m". """
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+
+
+def _local_minima(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Find the interior local minima along the first axis of `values`.
+    Returns the sample index and the index along the second axis of each.
+    """
+    prev, mid, nxt = values[:-2], values[1:-1], values[2:]
+    k, j = np.nonzero((mid < prev) & (mid <= nxt))
+    return k + 1, j
+
+
+def _refine_minimum(values: np.ndarray, k: np.ndarray, j: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """ Fit a parabola through each minimum and its neighbours. Returns the
+    fractional sample offset of the true minimum and its value.
+    """
+    y0, y1, y2 = values[k - 1, j], values[k, j], values[k + 1, j]
+    curvature = y0 - 2 * y1 + y2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shift = np.where(curvature > 0, 0.5 * (y0 - y2) / curvature, 0.0)
+    shift = np.clip(shift, -0.5, 0.5)
+    return shift, y1 - 0.25 * (y0 - y2) * shift
+
+
+def _angle_between(u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """ Angle between two arrays of vectors, robust for small angles. """
+    cross = np.linalg.norm(np.cross(u, v), axis=-1)
+    dot = (u * v).sum(axis=-1)
+    return np.arctan2(cross, dot)
+
+
+class EventPredictor:
+    """ Heap of upcoming events for the bodies in an `OrbitEngine`. """
+    def __init__(
+        self,
+        engine: OrbitEngine,
+        window: float = 600.0,
+        samples_per_window: int = 256,
+        sub_windows: int = 8,
+        alignment_threshold: float = math.radians(2),
+        eclipse_threshold: float = math.radians(1),
+        max_drift: float = 1.0,
+    ):
+        self.engine = engine
+        # Length of each prediction window in seconds and how many points the
+        # orbits are sampled at within it.
+        self.window = window
+        self.samples_per_window = samples_per_window
+        # The window is predicted in this many parts, one per update.
+        self.sub_windows = sub_windows
+        self.alignment_threshold = alignment_threshold
+        self.eclipse_threshold = eclipse_threshold
+        # How far (in seconds) a body may fall behind the predictions before
+        # they are redone.
+        self.max_drift = max_drift
+        # The body the player is on (or near), used for eclipses. -1 for none.
+        self.observer_index = -1
+        self._queue: list[tuple[float, int, orbitEvent]] = []
+        # Heaps of the same events by (kind, body), where either may be None for
+        # any kind or any body. The overall queue is the (None, None) heap.
+        self._queues: dict[tuple[Optional[str], Optional[int]], list[tuple[float, int, orbitEvent]]] = {
+            (None, None): self._queue,
+        }
+        self._counter = itertools.count()
+        self._predicted_until = 0.0
+        self._last_epoch = 0.0
+        self._time_offsets = engine.time_offsets.copy()
+        self._epoch_times = engine.times - engine.epoch
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def reset(self):
+        """ Forget all predictions and start again from the current epoch. """
+        self._queue.clear()
+        self._queues = {(None, None): self._queue}
+        self._predicted_until = self.engine.epoch
+        self._last_epoch = self.engine.epoch
+        self._time_offsets = self.engine.time_offsets.copy()
+        # The time of each body at epoch 0 if it ran at the full rate.
+        self._epoch_times = self.engine.times - self.engine.epoch
+
+    def set_observer(self, index: int):
+        if index != self.observer_index:
+            self.observer_index = index
+            self.reset()
+
+    def update(self):
+        """ Drop events which have happened and predict another part of the
+        window if the predictions don't reach a full window ahead.
+        """
+        engine = self.engine
+        # Redo the predictions if the clock has been set back, the engine has
+        # grown, or a body has been slowed down too much.
+        if (
+            engine.epoch < self._last_epoch
+            or len(engine.time_offsets) != len(self._time_offsets)
+            or np.abs(engine.time_offsets - self._time_offsets).max(initial=0) > self.max_drift
+        ):
+            self.reset()
+        self._last_epoch = engine.epoch
+        self._drop_past(self._queue)
+        # Work towards a full window of predictions ahead of the current epoch.
+        if self._predicted_until < engine.epoch + self.window:
+            start = max(self._predicted_until, engine.epoch)
+            end = start + self.window / self.sub_windows
+            samples = max(2, self.samples_per_window // self.sub_windows)
+            for event in self.predict(start, end, samples):
+                self._push(event)
+            self._predicted_until = end
+            # Clear out the heaps which haven't been looked at for a while.
+            for queue in self._queues.values():
+                self._drop_past(queue)
+
+    def _push(self, event: orbitEvent):
+        entry = (event.epoch, next(self._counter), event)
+        for kind in (None, event.kind):
+            for body in {None, event.first, event.second}:
+                heapq.heappush(self._queues.setdefault((kind, body), []), entry)
+
+    def _drop_past(self, queue: list[tuple[float, int, orbitEvent]]):
+        epoch = self.engine.epoch
+        while queue and queue[0][0] < epoch:
+            heapq.heappop(queue)
+
+    def next_event(self, kind: Optional[str] = None, body: int = -1) -> Optional[orbitEvent]:
+        """ Return the next event, optionally of a given kind or involving a
+        given body.
+        """
+        queue = self._queues.get((kind, None if body == -1 else body))
+        if not queue:
+            return None
+        self._drop_past(queue)
+        return queue[0][2] if queue else None
+
+    def upcoming(self, count: Optional[int] = None) -> Iterator[orbitEvent]:
+        """ Iterate over the predicted events in the order they happen, or just
+        the first `count` of them.
+        """
+        if count is None:
+            entries = sorted(self._queue)
+        else:
+            entries = heapq.nsmallest(count, self._queue)
+        for _, _, event in entries:
+            yield event
+
+    def time_until(self, event: orbitEvent) -> float:
+        return event.epoch - self.engine.epoch
+
+    def _sample_positions(self, epochs: np.ndarray) -> np.ndarray:
+        """ Positions of every body relative to the star at each of the given
+        epochs, with shape `(len(epochs), capacity, 3)`.
+        """
+        engine = self.engine
+        idx = engine.body_indexes
+        k, m = len(epochs), len(idx)
+        t = (self._epoch_times[idx][None, :] + epochs[:, None]).ravel()
+        rel_pos, _ = sample_orbits(
+            engine.integration_mode,
+            np.tile(engine.a[idx], k),
+            np.tile(engine.b[idx], k),
+            np.tile(engine.alpha[idx], k),
+            np.tile(engine.delta[idx], k),
+            np.tile(engine.e[idx], k),
+            t,
+        )
+        rel_pos = np.einsum("mij,kmj->kmi", engine.orientation[idx], rel_pos.reshape(k, m, 3))
+        pos = np.zeros((k, engine.capacity, 3))
+        pos[:, idx] = rel_pos
+        for level, parents in zip(engine.levels[1:], engine.level_parents[1:]):
+            pos[:, level] += pos[:, parents]
+        return pos
+
+    def predict(self, start: float, end: float, samples: Optional[int] = None) -> list[orbitEvent]:
+        """ Find all the events between the epochs `start` and `end`, sampling
+        the orbits at `samples` points (by default `samples_per_window`).
+        """
+        engine = self.engine
+        n = samples or self.samples_per_window
+        step = (end - start) / n
+        # Sample one step either side so that minima at the edges are found.
+        epochs = start + step * np.arange(-1, n + 2)
+        pos = self._sample_positions(epochs)
+        events = []
+
+        def add_events(kind, values, first, second, threshold=math.inf):
+            k, j = _local_minima(values)
+            shift, minimum = _refine_minimum(values, k, j)
+            when = epochs[k] + shift * step
+            keep = (minimum < threshold) & (when >= start) & (when < end)
+            for w, f, s, v in zip(when[keep], first[j[keep]], second[j[keep]], minimum[keep]):
+                events.append(orbitEvent(float(w), kind, int(f), int(s), float(v)))
+
+        planets, moons = engine.planet_indexes, engine.moon_indexes
+        if len(moons) and len(planets):
+            # Every moon against every planet it doesn't orbit.
+            moon, planet = np.meshgrid(moons, planets, indexing="ij")
+            moon, planet = moon.ravel(), planet.ravel()
+            keep = engine.parent[moon] != planet
+            moon, planet = moon[keep], planet[keep]
+            dist = np.linalg.norm(pos[:, moon] - pos[:, planet], axis=-1)
+            add_events(EVENT_CLOSEST_APPROACH, dist, moon, planet)
+        if len(planets) > 1:
+            first, second = np.triu_indices(len(planets), 1)
+            first, second = planets[first], planets[second]
+            angle = _angle_between(pos[:, first], pos[:, second])
+            add_events(EVENT_ALIGNMENT, angle, first, second, self.alignment_threshold)
+        observer = self.observer_index
+        if observer != -1 and engine.active[observer]:
+            others = engine.body_indexes[engine.body_indexes != observer]
+            if len(others):
+                to_star = -pos[:, observer][:, None, :]
+                to_body = pos[:, others] - pos[:, observer][:, None, :]
+                angle = _angle_between(to_body, to_star)
+                # Only bodies between the observer and the star can eclipse it.
+                in_front = (to_body * to_star).sum(axis=-1) > 0
+                angle = np.where(in_front, angle, math.pi)
+                add_events(
+                    EVENT_ECLIPSE,
+                    angle,
+                    np.full(len(others), observer),
+                    others,
+                    self.eclipse_threshold,
+                )
+        return events
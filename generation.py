@@ -0,0 +1,179 @@
+""" Orbit generation for Newton.
+
+The orbit of each body is a deterministic function of its seed and the global
+settings. This is kept free of any dependency on pymhf or nmspy so that orbits
+can also be generated outside of the game.
+"""
+
+from dataclasses import dataclass
+import math
+import random
+from typing import Optional
+
+from orbits import STAR_MU, mean_motion, orbitParams
+
+
+@dataclass
+class NewtonGlobals:
+    min_planet_epsilon: float
+    max_planet_epsilon: float
+    min_moon_epsilon: float
+    max_moon_epsilon: float
+    avg_planet_separation: float
+    approach_rate_dropoff: int
+    max_planet_inclination: float
+    max_moon_inclination: float
+    ephemeris_budget: int
+    ephemeris_max_samples: int
+    nbody_planet_mass_ratio: float
+    nbody_moon_mass_ratio: float
+    nbody_max_step: float
+    nbody_hill_fraction: float
+    nbody_max_mass_ratio: float
+    simulation_tick_rate: float
+    max_ticks_per_frame: int
+    nearest_body_hysteresis: float
+    decimation_threshold: float
+    decimation_max_interval: int
+    decimation_max_updates: int
+    frame_budget: float
+    visibility_view_angle: float
+    visibility_draw_distance: float
+    visibility_gravity_interval: int
+    shift_threshold: float
+    shift_max_age: int
+    process_tick_rate: float
+    star_mu: float
+    planet_surface_gravity: float
+
+
+def default_globals() -> NewtonGlobals:
+    return NewtonGlobals(
+        min_planet_epsilon = 0.01,
+        max_planet_epsilon = 0.2,
+        min_moon_epsilon = 0,
+        max_moon_epsilon = 0.05,
+        avg_planet_separation = 300000.0,
+        approach_rate_dropoff = 3,
+        max_planet_inclination = math.radians(5),
+        max_moon_inclination = math.radians(15),
+        ephemeris_budget = 4 << 20,
+        ephemeris_max_samples = 1024,
+        nbody_planet_mass_ratio = 0.02,
+        nbody_moon_mass_ratio = 1e-4,
+        nbody_max_step = 2.0,
+        nbody_hill_fraction = 1 / 3,
+        nbody_max_mass_ratio = 0.1,
+        simulation_tick_rate = 20.0,
+        max_ticks_per_frame = 5,
+        nearest_body_hysteresis = 0.05,
+        decimation_threshold = 2e-4,
+        decimation_max_interval = 30,
+        decimation_max_updates = 4,
+        frame_budget = 3e-4,
+        visibility_view_angle = math.radians(120),
+        visibility_draw_distance = math.inf,
+        visibility_gravity_interval = 10,
+        shift_threshold = 0.5,
+        shift_max_age = 8,
+        process_tick_rate = 120.0,
+        star_mu = STAR_MU,
+        planet_surface_gravity = 9.81,
+    )
+
+
+# The settings which `generate_orbit_params` reads. Anything else in the
+# globals only changes how the orbits are simulated, not the orbits themselves.
+GENERATION_SETTINGS = (
+    "min_planet_epsilon",
+    "max_planet_epsilon",
+    "min_moon_epsilon",
+    "max_moon_epsilon",
+    "avg_planet_separation",
+    "max_planet_inclination",
+    "max_moon_inclination",
+    "star_mu",
+    "planet_surface_gravity",
+)
+
+
+def generation_settings(newton_globals: NewtonGlobals) -> tuple:
+    """ Return the values of the settings which the orbit generation uses. """
+    return tuple(getattr(newton_globals, name) for name in GENERATION_SETTINGS)
+
+
+def generate_orbit_params(
+    seed: int,
+    index: int,
+    is_moon: bool,
+    newton_globals: NewtonGlobals,
+    parent_planet_radius: Optional[float] = None,
+) -> orbitParams:
+    """ Generate the orbit parameters of a body.
+
+    Moons are placed relative to the radius of their parent planet if it is
+    known, otherwise they are spaced out like planets.
+    """
+    # Each body gets its own generator so that the results don't depend on
+    # the order the bodies are generated in.
+    rng = random.Random(seed)
+    delta = rng.random() * math.tau
+    epsilon = 0
+    variance = 0.1 * newton_globals.avg_planet_separation
+
+    # Determine the eccentricity of the orbit.
+    if is_moon:
+        epsilon = rng.uniform(
+            newton_globals.min_moon_epsilon,
+            newton_globals.max_moon_epsilon
+        )
+    else:
+        epsilon = rng.uniform(
+            newton_globals.min_planet_epsilon,
+            newton_globals.max_planet_epsilon
+        )
+
+    # Gravitational parameter of the body being orbited.
+    mu = newton_globals.star_mu
+
+    # Determine the semi-minor axis first as we want this to be always clear
+    # of the previous orbit.
+    if is_moon and parent_planet_radius is not None:
+        b = rng.uniform(
+            1.75 * parent_planet_radius,
+            2.25 * parent_planet_radius
+        )
+        # Base the mass of the planet on its size.
+        mu = newton_globals.planet_surface_gravity * parent_planet_radius ** 2
+    else:
+        b = (index + 1) * newton_globals.avg_planet_separation + variance * rng.uniform(-1, 1)
+
+    # Then calculate the semi-major axis from the eccentricity.
+    a = b / math.sqrt(1 - epsilon * epsilon)
+
+    # The period follows from the mass of whatever is being orbited.
+    alpha = mean_motion(mu, a)
+
+    # Finally, tilt the orbit out of the reference plane. These are drawn
+    # last so that the other parameters are the same as for flat orbits.
+    if is_moon:
+        max_inclination = newton_globals.max_moon_inclination
+    else:
+        max_inclination = newton_globals.max_planet_inclination
+    inclination = rng.uniform(-max_inclination, max_inclination)
+    node = rng.random() * math.tau
+    return orbitParams(a, b, alpha, delta, inclination, node)
+
+
+def format_period(period: float) -> str:
+    # Generate the string representation of the planet periods now so we can
+    # just display them later
+    # TODO: Just use HH:mm notation...
+    suffix = "seconds"
+    if 60 < period < 3600:
+        suffix = "minutes"
+        period = period / 60
+    elif period >= 3600:
+        suffix = "hours"
+        period = period / 3600
+    return f"{period:.2f} {suffix}"
@@ -0,0 +1,86 @@
+""" Keep the time Newton spends each frame within a budget.
+
+Computing the positions of the bodies is cheap, but writing each one to the game
+is not. The writes are done in order of priority until the frame's budget runs
+out, and the rest are deferred to the next frame. A deferred body has been
+waiting longer so goes earlier next frame, which makes the writes round-robin
+when there are too many for one frame. As a body is always written at its
+position for the frame it is written in, it catches up in a single write
+however many frames it was deferred for.
+"""
+
+import time
+from typing import Callable
+
+import numpy as np
+
+from orbits import grow_array
+
+
+class FrameGovernor:
+    """ Write bodies within a per-frame time budget. """
+    def __init__(self, capacity: int = 8, budget: float = 3e-4):
+        # Seconds per frame, counted from `start_frame`.
+        self.budget = budget
+        # Frames each body has been waiting to be written.
+        self.age = np.zeros(capacity, dtype=np.intp)
+        self._deadline = 0.0
+        # Frames run, frames where some writes had to be deferred, and the
+        # total number of deferred writes.
+        self.frames = 0
+        self.deferred_frames = 0
+        self.deferred = 0
+
+    def grow(self, capacity: int):
+        """ Make room for `capacity` bodies, keeping how long each has waited. """
+        if capacity > len(self.age):
+            self.age = grow_array(self.age, capacity)
+
+    def reset_stats(self):
+        self.frames = 0
+        self.deferred_frames = 0
+        self.deferred = 0
+
+    def start_frame(self):
+        """ Start the clock on this frame's budget. """
+        self._deadline = time.perf_counter() + self.budget
+        self.frames += 1
+
+    @property
+    def exhausted(self) -> bool:
+        return time.perf_counter() >= self._deadline
+
+    def order(self, indexes, first: int = -1) -> list[int]:
+        """ Order the bodies by priority: `first` (eg. the nearest body), then
+        the ones which have been waiting the longest.
+        """
+        indexes = np.asarray(indexes, dtype=np.intp)
+        self.age[indexes] += 1
+        priority = self.age[indexes]
+        priority[indexes == first] = np.iinfo(np.intp).max
+        return indexes[np.argsort(-priority, kind="stable")].tolist()
+
+    def run(self, indexes, write: Callable[[int], None], first: int = -1) -> int:
+        """ Call `write` on each of the bodies in order of priority until the
+        budget runs out. The first body is always written. Returns how many of
+        them were deferred.
+        """
+        ordered = self.order(indexes, first)
+        for n, index in enumerate(ordered):
+            if n and self.exhausted:
+                deferred = len(ordered) - n
+                self.deferred += deferred
+                self.deferred_frames += 1
+                return deferred
+            write(index)
+            self.age[index] = 0
+        return 0
+
+    def summary(self) -> str:
+        if self.frames == 0:
+            return "No frames run"
+        return (
+            f"Deferred writes in {self.deferred_frames}/{self.frames} frames "
+            f"({100 * self.deferred_frames / self.frames:.1f}%), "
+            f"{self.deferred / self.frames:.2f} deferred writes per frame on average"
+        )
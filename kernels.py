@@ -0,0 +1,145 @@
+""" Compiled kernels for the per-frame update.
+
+When numba is installed these are compiled to machine code, which removes the
+overhead of the many small NumPy calls the vectorized engine otherwise makes
+every frame. Without numba they are plain Python functions which give the same
+results (just more slowly), so they can always be called directly.
+"""
+
+import math
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """ Stand in for `numba.njit` which leaves the function as it is. """
+        def wrap(func):
+            func.py_func = func
+            return func
+        return wrap
+
+
+@njit(cache=True)
+def closed_form_offsets(
+    a: np.ndarray,
+    b: np.ndarray,
+    alpha: np.ndarray,
+    delta: np.ndarray,
+    times: np.ndarray,
+    out: np.ndarray,
+):
+    """ Position of every body relative to its parent within its orbit plane. """
+    for i in range(len(a)):
+        phase = alpha[i] * times[i] + delta[i]
+        out[i, 0] = a[i] * math.cos(phase)
+        out[i, 1] = b[i] * math.sin(phase)
+        out[i, 2] = 0.0
+
+
+@njit(cache=True)
+def rotate_offsets(offsets: np.ndarray, basis_x: np.ndarray, basis_y: np.ndarray):
+    """ Rotate each in-plane offset (x, y, 0) by its orbit orientation, in place. """
+    for i in range(len(offsets)):
+        x = offsets[i, 0]
+        y = offsets[i, 1]
+        for k in range(3):
+            offsets[i, k] = basis_x[i, k] * x + basis_y[i, k] * y
+
+
+@njit(cache=True)
+def place_bodies(
+    offsets: np.ndarray,
+    center: np.ndarray,
+    moon_indexes: np.ndarray,
+    moon_parents: np.ndarray,
+    fixed_index: int,
+    fixed_position: np.ndarray,
+    out: np.ndarray,
+):
+    """ Turn the offsets into absolute positions, with moons placed around the
+    new positions of their parents. The moons must be in topological order so
+    that parents are placed before their children. `fixed_index` may be -1 for
+    no fixed body.
+    """
+    for i in range(len(offsets)):
+        for k in range(3):
+            out[i, k] = offsets[i, k] + center[k]
+    if fixed_index != -1:
+        for k in range(3):
+            out[fixed_index, k] = fixed_position[k]
+    for j in range(len(moon_indexes)):
+        i = moon_indexes[j]
+        if i == fixed_index:
+            continue
+        p = moon_parents[j]
+        for k in range(3):
+            out[i, k] = out[p, k] + offsets[i, k]
+
+
+@njit(cache=True)
+def ephemeris_offsets(
+    samples: np.ndarray,
+    start: np.ndarray,
+    count: np.ndarray,
+    orbit_rate: np.ndarray,
+    times: np.ndarray,
+    out: np.ndarray,
+):
+    """ Position of every body relative to its parent from an ephemeris table,
+    as in `ephemeris.EphemerisTable.evaluate`.
+    """
+    for i in range(len(times)):
+        u = times[i] * orbit_rate[i]
+        u = (u - math.floor(u)) * count[i]
+        k = min(math.floor(u), count[i] - 1)
+        u -= k
+        j = start[i] + int(k)
+        for d in range(3):
+            out[i, d] = ((samples[3, j, d] * u + samples[2, j, d]) * u + samples[1, j, d]) * u + samples[0, j, d]
+
+
+@njit(cache=True)
+def approach_rate(dist: float, near: float, far: float, n: float) -> float:
+    """ Rate at which time passes for a body the player is `dist` from. This
+    falls smoothly from 1 at `far` to 0 at `near`.
+    """
+    if near < dist < far:
+        a_n = near ** n
+        val = (dist ** n - a_n) / (far ** n - a_n)
+        return min(max(val, 0.0), 1.0)
+    if dist < near:
+        return 0.0
+    return 1.0
+
+
+def warm_up():
+    """ Compile every kernel now rather than the first time it is used.
+
+    numba compiles a kernel (or loads it from its cache) on its first call,
+    which would otherwise stall the first frame that needs it. The arguments
+    have the same types as the ones the engines pass, so the compiled versions
+    are the ones used later.
+    """
+    if not HAS_NUMBA:
+        return
+    n = 2
+    vec = np.zeros(n)
+    offsets = np.zeros((n, 3))
+    indexes = np.zeros(1, dtype=np.intp)
+    closed_form_offsets(vec, vec, vec, vec, vec, offsets)
+    rotate_offsets(offsets, np.zeros((n, 3)), np.zeros((n, 3)))
+    place_bodies(offsets, np.zeros(3), indexes, indexes, -1, np.zeros(3), np.zeros((n, 3)))
+    ephemeris_offsets(
+        np.zeros((4, n, 3), dtype=np.float32),
+        np.zeros(n, dtype=np.intp),
+        np.ones(n),
+        vec,
+        vec,
+        offsets,
+    )
+    approach_rate(1.0, 0.0, 2.0, 3.0)
@@ -0,0 +1,279 @@
+""" N-body simulation engine for Newton.
+
+Rather than moving each body along a fixed orbit, this integrates the mutual
+gravity between the star, planets and moons with a symplectic leapfrog
+(velocity Verlet) integrator. Pairwise accelerations are computed with NumPy
+broadcasting so that each step is a handful of batched operations.
+"""
+
+import math
+from typing import Optional
+
+import numpy as np
+
+from orbits import OrbitEngine, sample_orbits
+
+
+def body_masses(
+    engine: OrbitEngine,
+    star_mu: float,
+    planet_mu: float,
+    moon_mu: float,
+    hill_fraction: float = 1 / 3,
+    max_mass_ratio: float = 0.1,
+) -> tuple[np.ndarray, list[int]]:
+    """ Gravitational parameter of each body in the orbit engine.
+
+    A body with moons gets the parameter its moons' orbits were generated with
+    (alpha^2 * a^3), and any other body gets `planet_mu` or `moon_mu`. A moon
+    only stays bound to its parent if it is well within the parent's Hill
+    radius, so if it isn't within `hill_fraction` of it the parent is made
+    heavier, though no heavier than `max_mass_ratio` of whatever it orbits.
+    Moons without moons of their own are made lighter if they would otherwise
+    pull each other out of their orbits.
+
+    The moons are generated close to their planets, which are close to the
+    star, so in most systems some moons can't be kept bound this way. Those
+    moons (and anything orbiting them) are returned as well, to follow their
+    orbits around the simulated parent instead of being simulated. A body whose
+    moons all follow keeps the default parameter.
+    """
+    mu = np.zeros(engine.capacity)
+    mu[engine.planet_indexes] = planet_mu
+    mu[engine.moon_indexes] = moon_mu
+    orbit_mu = engine.alpha ** 2 * engine.a ** 3
+    apoapsis = engine.a * (1 + engine.e)
+    periapsis = engine.a * (1 - engine.e)
+    moons: dict[int, list[int]] = {}
+    for index in engine.moon_indexes.tolist():
+        moons.setdefault(int(engine.parent[index]), []).append(index)
+    unbound = set()
+    # Bodies are in topological order, so whatever each one orbits is done.
+    for index in engine.body_indexes.tolist():
+        if index not in moons:
+            continue
+        children = moons[index]
+        if index in unbound:
+            unbound.update(children)
+            continue
+        parent = int(engine.parent[index])
+        parent_mu = star_mu if parent == -1 else mu[parent]
+        # Hill radius r_H = r * cbrt(mu / (3 * parent_mu)) at periapsis.
+        furthest = apoapsis[children].max() / hill_fraction
+        needed = 3 * parent_mu * (furthest / periapsis[index]) ** 3
+        body_mu = max(orbit_mu[children].max(), needed)
+        if body_mu > max_mass_ratio * parent_mu:
+            unbound.update(children)
+            continue
+        mu[index] = body_mu
+        unbound.update(_separate_moons(engine, children, body_mu, mu, moons))
+    return mu, sorted(unbound)
+
+
+def _separate_moons(
+    engine: OrbitEngine,
+    children: list[int],
+    parent_mu: float,
+    mu: np.ndarray,
+    moons: dict[int, list[int]],
+) -> list[int]:
+    """ Lighten the moons of a body so that neighbouring orbits are at least
+    2 * sqrt(3) mutual Hill radii apart. Moons with moons of their own keep
+    their mass. Returns the moons which are still too close.
+    """
+    unbound = []
+    children = sorted(children, key=lambda index: engine.a[index])
+    for inner, outer in zip(children, children[1:]):
+        gap = engine.a[outer] * (1 - engine.e[outer]) - engine.a[inner] * (1 + engine.e[inner])
+        mean = 0.5 * (engine.a[inner] + engine.a[outer])
+        allowed = 3 * parent_mu * (max(gap, 0) / (2 * math.sqrt(3) * mean)) ** 3
+        pair = [inner, outer]
+        fixed = sum(mu[index] for index in pair if index in moons)
+        light = [index for index in pair if index not in moons]
+        if fixed > allowed:
+            unbound.extend(pair)
+        elif mu[pair].sum() > allowed:
+            mu[light] *= (allowed - fixed) / mu[light].sum()
+    return unbound
+
+
+class NBodyEngine:
+    """ Integrate the mutual gravity of a star and the bodies orbiting it.
+
+    Row 0 of the state arrays is the star and row `i + 1` is the body with
+    index `i` in the orbit engine the simulation was created from. Positions
+    are reported relative to the star so that the solar system center keeps
+    following it even though it recoils from the planets.
+    """
+    def __init__(
+        self,
+        indexes: np.ndarray,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        mu: np.ndarray,
+        capacity: int,
+        max_step: float = 2.0,
+        softening: float = 1000.0,
+        orbit_engine: Optional[OrbitEngine] = None,
+        followers: Optional[np.ndarray] = None,
+    ):
+        # Engine index of each simulated body (excluding the star).
+        self.indexes = indexes
+        # Bodies which aren't simulated but follow their orbits in
+        # `orbit_engine` around their simulated parent, in topological order.
+        self.orbit_engine = orbit_engine
+        self.followers = np.zeros(0, dtype=np.intp) if followers is None else followers
+        # Every body given a position, simulated or not.
+        self.moved_indexes = np.concatenate([indexes, self.followers])
+        self.pos = positions
+        self.vel = velocities
+        # Gravitational parameter (G * M) of each body.
+        self.mu = mu
+        # Largest step taken by the integrator. Bigger frame steps are split
+        # into equal substeps no larger than this.
+        self.max_step = max_step
+        self.softening = softening
+        self.time = 0.0
+        # Positions relative to the star, indexed like the orbit engine, and
+        # the absolute positions returned by `positions_around`.
+        self.positions = np.zeros((capacity, 3))
+        self._absolute = np.zeros((capacity, 3))
+
+        n = len(mu)
+        self._acc = np.zeros((n, 3))
+        self._sep = np.zeros((n, n, 3))
+        self._inv_r3 = np.zeros((n, n))
+        self._tmp = np.zeros((n, 3))
+        self._compute_acceleration()
+
+    @property
+    def body_count(self) -> int:
+        return len(self.mu)
+
+    @classmethod
+    def from_orbit_engine(
+        cls,
+        engine: OrbitEngine,
+        star_mu: float,
+        mu: np.ndarray,
+        followers=(),
+        **kwargs,
+    ) -> Optional["NBodyEngine"]:
+        """ Create a simulation whose bodies start at the positions given by
+        the orbit engine at its current times. The bodies in `followers` (and
+        anything orbiting them) are moved along their orbits in the engine
+        rather than simulated.
+
+        The velocities relative to each parent are those of the orbit, scaled
+        so that the orbit is bound by the parent's `mu` rather than the mass
+        implied by the orbit period. Returns None if there are no bodies.
+        """
+        following = set(followers)
+        for index in engine.body_indexes.tolist():
+            if engine.parent[index] in following:
+                following.add(index)
+        is_follower = np.isin(engine.body_indexes, list(following))
+        indexes = engine.body_indexes[~is_follower]
+        if len(indexes) == 0:
+            return None
+        rel_pos, rel_vel = sample_orbits(
+            engine.integration_mode,
+            engine.a[indexes],
+            engine.b[indexes],
+            engine.alpha[indexes],
+            engine.delta[indexes],
+            engine.e[indexes],
+            engine.times[indexes],
+        )
+        orientation = engine.orientation[indexes]
+        rel_pos = np.einsum("nij,nj->ni", orientation, rel_pos)
+        rel_vel = np.einsum("nij,nj->ni", orientation, rel_vel)
+
+        parents = engine.parent[indexes]
+        parent_mu = np.where(parents == -1, star_mu, mu[np.maximum(parents, 0)])
+        # The orbit period implies a parent mass of alpha^2 * a^3.
+        orbit_mu = engine.alpha[indexes] ** 2 * engine.a[indexes] ** 3
+        rel_vel *= np.sqrt(parent_mu / orbit_mu)[:, None]
+
+        # Bodies are in topological order, so their parents are already placed.
+        row = np.zeros(engine.capacity, dtype=np.intp)
+        row[indexes] = np.arange(1, len(indexes) + 1)
+        pos = np.zeros((len(indexes) + 1, 3))
+        vel = np.zeros((len(indexes) + 1, 3))
+        for i, (index, parent) in enumerate(zip(indexes.tolist(), parents.tolist())):
+            parent_row = 0 if parent == -1 else row[parent]
+            pos[i + 1] = pos[parent_row] + rel_pos[i]
+            vel[i + 1] = vel[parent_row] + rel_vel[i]
+
+        body_mu = np.concatenate([[star_mu], mu[indexes]])
+        # Start with zero total momentum so the system doesn't drift away.
+        vel -= (body_mu[:, None] * vel).sum(axis=0) / body_mu.sum()
+        return cls(
+            indexes,
+            pos,
+            vel,
+            body_mu,
+            engine.capacity,
+            orbit_engine=engine,
+            followers=engine.body_indexes[is_follower],
+            **kwargs,
+        )
+
+    def _compute_acceleration(self):
+        """ Compute the gravitational acceleration of every body from every
+        other body with a single broadcasted pairwise pass.
+        """
+        sep, inv_r3 = self._sep, self._inv_r3
+        # sep[i, j] = pos[j] - pos[i]
+        np.subtract(self.pos[None, :, :], self.pos[:, None, :], out=sep)
+        np.einsum("ijk,ijk->ij", sep, sep, out=inv_r3)
+        inv_r3 += self.softening * self.softening
+        np.power(inv_r3, -1.5, out=inv_r3)
+        # A body does not attract itself (sep is zero there anyway).
+        np.fill_diagonal(inv_r3, 0)
+        inv_r3 *= self.mu[None, :]
+        np.einsum("ij,ijk->ik", inv_r3, sep, out=self._acc)
+
+    def step(self, dt: float):
+        """ Advance the simulation by `dt`, split into substeps if required. """
+        if dt <= 0:
+            return
+        substeps = max(1, math.ceil(dt / self.max_step))
+        h = dt / substeps
+        for _ in range(substeps):
+            # Kick, drift, kick.
+            np.multiply(self._acc, 0.5 * h, out=self._tmp)
+            self.vel += self._tmp
+            np.multiply(self.vel, h, out=self._tmp)
+            self.pos += self._tmp
+            self._compute_acceleration()
+            np.multiply(self._acc, 0.5 * h, out=self._tmp)
+            self.vel += self._tmp
+        self.time += dt
+
+    def relative_positions(self) -> np.ndarray:
+        """ Return the position of each body relative to the star, indexed by
+        the orbit engine indexes.
+        """
+        np.subtract(self.pos[1:], self.pos[0], out=self._tmp[1:])
+        self.positions[self.indexes] = self._tmp[1:]
+        engine = self.orbit_engine
+        for index in self.followers.tolist():
+            parent = engine.parent[index]
+            self.positions[index] = self.positions[parent] + engine.offset_at(index, engine.times[index])
+        return self.positions
+
+    def positions_around(self, center) -> np.ndarray:
+        """ Return the positions of the bodies about the star at `center`.
+        This is a separate buffer so the relative positions are left alone.
+        """
+        np.add(self.positions, center, out=self._absolute)
+        return self._absolute
+
+    def energy(self) -> float:
+        """ Total energy of the system (multiplied by G), used to check for drift. """
+        kinetic = 0.5 * (self.mu * (self.vel ** 2).sum(axis=1)).sum()
+        sep = self.pos[None, :, :] - self.pos[:, None, :]
+        dist = np.sqrt((sep ** 2).sum(axis=2) + self.softening ** 2)
+        potential = -0.5 * (np.outer(self.mu, self.mu) / dist)[~np.eye(len(self.mu), dtype=bool)].sum()
+        return kinetic + potential
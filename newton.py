@@ -1,5 +1,5 @@
 # /// script
-# dependencies = ["nmspy"]
+# dependencies = ["nmspy", "numpy"]
 # requires-python = ">=3.9, <4"
 #
 # [tool.pymhf]
@@ -17,13 +17,16 @@
 # window_name_override = "Newton"
 # ///
 
+from collections import deque, namedtuple
 import ctypes
-from collections import namedtuple
 from dataclasses import dataclass
 import logging
 import math
-import random
-from typing import Optional
+import os.path as op
+import time
+
+import numpy as np
+from typing import Callable, Optional
 
 from pymhf import Mod, load_mod_file
 from pymhf.core.memutils import get_addressof, map_struct
@@ -40,22 +43,59 @@ import nmspy.data.basic_types as basic
 from nmspy.decorators import terminal_command
 from nmspy.common import gameData
 
+from background import SimulationWorker
+from decimation import UpdateScheduler
+from ephemeris import EphemerisTable
+from events import (
+    EVENT_ALIGNMENT,
+    EVENT_CLOSEST_APPROACH,
+    EventPredictor,
+    format_duration,
+    orbitEvent,
+)
+from generation import default_globals, format_period, generate_orbit_params
+from governor import FrameGovernor
+from kernels import HAS_NUMBA, approach_rate, warm_up
+from orbit_cache import OrbitCache, orbit_cache_key
+from nbody import NBodyEngine, body_masses
+from occlusion import occluders, occlusions
+from proximity import body_altitudes, nearest_body
+from shifts import ShiftCoalescer
+from simulation_process import COMMAND_BODIES, COMMAND_FIXED, COMMAND_RATES, SimulationProcess
+from timestep import FixedTimestep, PositionInterpolator
+from update_plan import CENTER_FIXED, CENTER_STAR, UpdatePlan, compile_update_plan
+from visibility import VisibilityTracker
+from orbits import (
+    INTEGRATION_CLOSED_FORM,
+    INTEGRATION_KEPLERIAN,
+    INTEGRATION_MODES,
+    STAR_MU,
+    OrbitEngine,
+    grow_array,
+    orbitParams,
+    orbit_orientation,
+    topological_levels,
+)
+
 
 logger = logging.getLogger("Newton")
 
 
-orbitParams = namedtuple("orbitParams", ["a", "b", "alpha", "delta"])
+# What a step of the vectorized simulation needs from the game, which is read
+# before the step so that the step itself can run off the main thread.
+stepJob = namedtuple("stepJob", ["delta", "nbody", "center", "fixed_index", "fixed_position"])
 
 
 @dataclass
 class NewtonState(ModState):
     """ Mod state which will be serialized for save data. """
     planet_times: list[float]
-    stopped_planet_index: int
     fixed_planet_position: basic.Vector3f
     solar_system_center: basic.Vector3f
     fixed_center: basic.Vector3f
     is_in_orbit: bool = False
+    # Wall-clock time the state was saved at, as a unix timestamp.
+    saved_at: float = 0.0
 
 
 @dataclass
@@ -63,9 +103,8 @@ class SingletonState(ModState):
     """ Mod state which is just used for singletons which are to be retained across reloads. """
     planet_periods: list[str]
     orbit_params: list[Optional[orbitParams]]
+    orbit_orientations: list[Optional[np.ndarray]]
     parent_planet_map: list[int]
-    planet_indexes: set[int]
-    moon_indexes: set[int]
     planet_seeds: list[int]
     planet_handles: list[Optional[basic.TkHandle]]
     planets: list[Optional[nms.cGcPlanet]]
@@ -75,27 +114,26 @@ class SingletonState(ModState):
     orbital_period_buffers: list[ctypes.Array[ctypes.c_char]] = None
 
 
-@dataclass
-class NewtonGlobals:
-    min_planet_epsilon: float
-    max_planet_epsilon: float
-    min_moon_epsilon: float
-    max_moon_epsilon: float
-    avg_planet_separation: float
-    approach_rate_dropoff: int
-
-
-def get_position_ellipse(center: basic.Vector3f, odata: Optional[orbitParams], t: float) -> basic.Vector3f:
+def get_position_ellipse(
+    center: basic.Vector3f,
+    odata: Optional[orbitParams],
+    t: float,
+    orientation: Optional[np.ndarray] = None,
+) -> basic.Vector3f:
     """ Generate the position at some given time based on the orbit parameters.
-    NOTE: This will generate an orbit which has no variance in the z-direction.
-    TODO: Have a normal vector arg or something to make orbits more interesting.
+    If provided, `orientation` is the rotation matrix from `orbit_orientation`
+    which tilts the orbit out of the reference plane.
     """
     if not odata:
         return basic.Vector3f(0, 0, 0)
+    x = odata.a * math.cos(odata.alpha * t + odata.delta)
+    y = odata.b * math.sin(odata.alpha * t + odata.delta)
+    if orientation is None:
+        return basic.Vector3f(center.x + x, center.y + y, center.z)
     return basic.Vector3f(
-        center.x + odata.a * math.cos(odata.alpha * t + odata.delta),
-        center.y + odata.b * math.sin(odata.alpha * t + odata.delta),
-        center.z
+        center.x + orientation[0, 0] * x + orientation[0, 1] * y,
+        center.y + orientation[1, 0] * x + orientation[1, 1] * y,
+        center.z + orientation[2, 0] * x + orientation[2, 1] * y,
     )
 
 
@@ -114,7 +152,6 @@ class Newton(Mod):
 
     save_state = NewtonState(
         planet_times=[0] * 8,
-        stopped_planet_index=-1,
         fixed_planet_position=basic.Vector3f(0, 0, 0),
         solar_system_center=basic.Vector3f(0, 0, 0),
         fixed_center=basic.Vector3f(0, 0, 0),
@@ -124,8 +161,7 @@ class Newton(Mod):
         parent_planet_map=[-1] * 8,
         planet_periods=[""] * 8,
         orbit_params=[None] * 8,
-        planet_indexes=set(),
-        moon_indexes=set(),
+        orbit_orientations=[None] * 8,
         planet_seeds=[0] * 8,
         planet_handles=[None] * 8,
         planets=[None] * 8,
@@ -138,14 +174,14 @@ class Newton(Mod):
         self.counter = 0
         self.lastRenderTimeMS = 0
 
-        self.newton_globals = NewtonGlobals(
-            min_planet_epsilon = 0.01,
-            max_planet_epsilon = 0.2,
-            min_moon_epsilon = 0,
-            max_moon_epsilon = 0.05,
-            avg_planet_separation = 300000.0,
-            approach_rate_dropoff = 3,
-        )
+        self.newton_globals = default_globals()
+
+        # Compile the numba kernels while the mod loads rather than stalling
+        # the first frame which uses them.
+        if HAS_NUMBA:
+            start = time.perf_counter()
+            warm_up()
+            logger.debug(f"Compiled the kernels in {time.perf_counter() - start:.2f}s")
 
         # Create a string buffer once and then keep a fixed reference to it so
         # that we don't need to do it every frame.
@@ -153,6 +189,10 @@ class Newton(Mod):
         self._orbital_period_buffers = []
 
         self.run = True
+        # Changes made from the GUI, which runs on its own thread. They are
+        # applied at the start of the next frame, when nothing else is using
+        # the simulation.
+        self._pending_changes: deque[tuple[Callable, tuple]] = deque()
 
         self._solarsystem_data: nmse.cGcSolarSystemData = None
         self._cached_hud_ptr = 0
@@ -161,8 +201,102 @@ class Newton(Mod):
 
         self._solarsystem_data_ptr = 0
 
+        # Opt-in engine which evaluates all the orbits in one batched pass.
+        # When it is in use the body times are derived from the engine's global
+        # epoch and are only synced back to the save state when saving.
+        self._use_vector_engine = False
+        # Whether the bodies should continue along their orbits while the game
+        # isn't running.
+        self._world_kept_turning = False
+        self._use_ephemeris = False
+        self._use_nbody = False
+        self.nbody_engine: Optional[NBodyEngine] = None
+        self._use_fixed_timestep = False
+        self.fixed_timestep = FixedTimestep(
+            self.newton_globals.simulation_tick_rate,
+            self.newton_globals.max_ticks_per_frame,
+        )
+        self.position_interpolator = PositionInterpolator(len(self.state.planets))
+        self._fixed_step_planet_to_not_move = -1
+        self._predict_events = False
+        # HUD text for the selected body while events are being predicted,
+        # along with the string it was created from.
+        self._event_hud_text = ""
+        self._event_hud_buffer: Optional[ctypes.Array[ctypes.c_char]] = None
+        # Orbits of the bodies seen in previous sessions.
+        self.orbit_cache = OrbitCache(op.join(op.dirname(__file__), "newton-orbit-cache.bin"))
+        self.orbit_cache.load()
+        # The per-body state is sized for as many bodies as the state lists
+        # hold, and grows if a system turns out to have more.
+        self.orbit_engine = OrbitEngine(len(self.state.planets))
+        for index, orb_params in enumerate(self.state.orbit_params):
+            if orb_params is not None:
+                self.orbit_engine.set_body(index, orb_params, self.state.parent_planet_map[index])
+        self.event_predictor = EventPredictor(self.orbit_engine)
+        # Indexes of the bodies with orbits, with every body after its parent.
+        self._body_order = self.body_order([params is not None for params in self.state.orbit_params])
+        # How to move the bodies in the current state. This is compiled when
+        # the state changes rather than worked out every frame.
+        self._update_plan: Optional[UpdatePlan] = None
+        # Where each body currently is in the game and its radius, kept up to
+        # date as they are moved so that line of sight queries don't need to
+        # read game memory.
+        capacity = self.orbit_engine.capacity
+        self.body_positions = np.zeros((capacity, 3))
+        self.body_radii = np.zeros(capacity)
+        self._body_known = np.zeros(capacity, dtype=bool)
+        # Height of the player above each body, and the nearest body, as
+        # computed from the above at the start of each frame.
+        self._use_simulated_proximity = True
+        self.body_altitudes = np.full(capacity, np.inf)
+        self._nearest_planet_index = -1
+        self._nearest_planet_distance = 0.0
+        # Only write the bodies which have moved far enough as seen from the
+        # player each frame (vectorized engine only).
+        self._decimate_updates = False
+        self.update_scheduler = self.make_update_scheduler(capacity)
+        # Keep the writes to the game within a time budget each frame.
+        self._use_frame_budget = False
+        self.frame_governor = FrameGovernor(capacity, self.newton_globals.frame_budget)
+        # Don't write the bodies the player can't see (vectorized engine only).
+        self._skip_hidden_bodies = False
+        self.visibility = self.make_visibility_tracker(capacity)
+        # Compute the positions for the next frame on a worker thread
+        # (vectorized engine only, without the fixed timestep).
+        self._simulate_in_background = False
+        # pymhf has no unload hook, so the thread is stopped when the worker is
+        # collected along with this mod after a reload, or at exit.
+        self.simulation_worker = SimulationWorker(self._run_step, capacity)
+        # Or in a separate process which publishes the positions to shared
+        # memory (vectorized engine only, in place of the fixed timestep).
+        self.simulation_process: Optional[SimulationProcess] = None
+        # The last command of each kind sent to the process.
+        self._process_commands: dict[str, tuple] = {}
+        # Hold back the transform shifts of bodies which have barely moved.
+        self._coalesce_shifts = False
+        self.shift_coalescer = ShiftCoalescer(
+            capacity,
+            self.newton_globals.shift_threshold,
+            self.newton_globals.shift_max_age,
+        )
+
     # GUI widgets
 
+    def _defer(self, func: Callable, *args):
+        """ Call `func` at the start of the next frame on the game's thread. """
+        self._pending_changes.append((func, args))
+
+    def _apply_pending_changes(self):
+        if not self._pending_changes:
+            return
+        self.simulation_worker.wait()
+        while self._pending_changes:
+            func, args = self._pending_changes.popleft()
+            try:
+                func(*args)
+            except Exception:
+                logger.exception(f"Error applying {func.__name__}")
+
     @property
     @BOOLEAN("Simulation Running: ")
     def simulation_running(self):
@@ -181,12 +315,236 @@ class Newton(Mod):
     def time_rate(self, value):
         self._time_rate = value
 
+    @property
+    @BOOLEAN("Vectorized engine: ")
+    def use_vector_engine(self):
+        return self._use_vector_engine
+
+    @use_vector_engine.setter
+    def use_vector_engine(self, value):
+        self._defer(self._set_use_vector_engine, value)
+
+    def _set_use_vector_engine(self, value):
+        self.simulation_worker.discard()
+        if not value and self.simulation_process is not None:
+            self.stop_simulation_process()
+        if value and not self._use_vector_engine:
+            self.orbit_engine.set_times(self.save_state.planet_times)
+        elif not value and self._use_vector_engine:
+            self._sync_planet_times()
+        self._use_vector_engine = value
+
+    @property
+    @BOOLEAN("Keplerian motion (vectorized engine only): ")
+    def keplerian_motion(self):
+        return self.orbit_engine.integration_mode == INTEGRATION_KEPLERIAN
+
+    @keplerian_motion.setter
+    def keplerian_motion(self, value):
+        self._defer(self._set_keplerian_motion, value)
+
+    def _set_keplerian_motion(self, value):
+        if value:
+            self.set_integration_mode(INTEGRATION_KEPLERIAN)
+        else:
+            self.set_integration_mode(INTEGRATION_CLOSED_FORM)
+
+    @property
+    @BOOLEAN("Ephemeris cache (vectorized engine only): ")
+    def use_ephemeris(self):
+        return self._use_ephemeris
+
+    @use_ephemeris.setter
+    def use_ephemeris(self, value):
+        self._defer(self._set_use_ephemeris, value)
+
+    def _set_use_ephemeris(self, value):
+        self.simulation_worker.discard()
+        self._use_ephemeris = value
+        if value:
+            self.build_ephemeris()
+        else:
+            self.orbit_engine.ephemeris = None
+        self._reload_simulation_process()
+
+    @property
+    @BOOLEAN("N-body simulation (vectorized engine only): ")
+    def use_nbody(self):
+        return self._use_nbody
+
+    @use_nbody.setter
+    def use_nbody(self, value):
+        self._defer(self._set_use_nbody, value)
+
+    def _set_use_nbody(self, value):
+        self.simulation_worker.discard()
+        self._use_nbody = value
+        if value:
+            self._pull_process_times()
+            self.build_nbody()
+        else:
+            self.nbody_engine = None
+        self.position_interpolator.reset()
+        self._reload_simulation_process()
+
+    @property
+    @BOOLEAN("Fixed timestep (vectorized engine only): ")
+    def use_fixed_timestep(self):
+        return self._use_fixed_timestep
+
+    @use_fixed_timestep.setter
+    def use_fixed_timestep(self, value):
+        self._defer(self._set_use_fixed_timestep, value)
+
+    def _set_use_fixed_timestep(self, value):
+        self.simulation_worker.discard()
+        self._use_fixed_timestep = value
+        self.fixed_timestep.reset()
+        self.position_interpolator.reset()
+
+    @property
+    @BOOLEAN("World kept turning: ")
+    def world_kept_turning(self):
+        return self._world_kept_turning
+
+    @world_kept_turning.setter
+    def world_kept_turning(self, value):
+        self._world_kept_turning = value
+
+    @property
+    @BOOLEAN("Predict events (vectorized engine only): ")
+    def predict_events(self):
+        return self._predict_events
+
+    @predict_events.setter
+    def predict_events(self, value):
+        self._defer(self._set_predict_events, value)
+
+    def _set_predict_events(self, value):
+        self._predict_events = value
+        self.event_predictor.reset()
+
+    @property
+    @BOOLEAN("Nearest body from simulation: ")
+    def use_simulated_proximity(self):
+        return self._use_simulated_proximity
+
+    @use_simulated_proximity.setter
+    def use_simulated_proximity(self, value):
+        self._defer(self._set_use_simulated_proximity, value)
+
+    def _set_use_simulated_proximity(self, value):
+        self._use_simulated_proximity = value
+        self.update_proximity()
+
+    @property
+    @BOOLEAN("Skip writing distant bodies (vectorized engine only): ")
+    def decimate_updates(self):
+        return self._decimate_updates
+
+    @decimate_updates.setter
+    def decimate_updates(self, value):
+        self._defer(self._set_decimate_updates, value)
+
+    def _set_decimate_updates(self, value):
+        self._decimate_updates = value
+        self.update_scheduler.reset()
+
+    @property
+    @BOOLEAN("Limit time per frame: ")
+    def use_frame_budget(self):
+        return self._use_frame_budget
+
+    @use_frame_budget.setter
+    def use_frame_budget(self, value):
+        self._defer(self._set_use_frame_budget, value)
+
+    def _set_use_frame_budget(self, value):
+        self._use_frame_budget = value
+        self.frame_governor.reset_stats()
+
+    @property
+    @FLOAT("Frame budget (ms): ")
+    def frame_budget(self):
+        return self.frame_governor.budget * 1000
+
+    @frame_budget.setter
+    def frame_budget(self, value):
+        self.frame_governor.budget = max(float(value), 0.0) / 1000
+
+    @property
+    @BOOLEAN("Skip writing hidden bodies (vectorized engine only): ")
+    def skip_hidden_bodies(self):
+        return self._skip_hidden_bodies
+
+    @skip_hidden_bodies.setter
+    def skip_hidden_bodies(self, value):
+        self._defer(self._set_skip_hidden_bodies, value)
+
+    def _set_skip_hidden_bodies(self, value):
+        self._skip_hidden_bodies = value
+        self.visibility.reset()
+
+    @property
+    @BOOLEAN("Coalesce small transform shifts: ")
+    def coalesce_shifts(self):
+        return self._coalesce_shifts
+
+    @coalesce_shifts.setter
+    def coalesce_shifts(self, value):
+        self._defer(self._set_coalesce_shifts, value)
+
+    def _set_coalesce_shifts(self, value):
+        if value:
+            self.shift_coalescer.reset_stats()
+        else:
+            self.flush_shifts()
+        self._coalesce_shifts = value
+
+    @property
+    @BOOLEAN("Simulate in the background (vectorized engine only): ")
+    def simulate_in_background(self):
+        return self._simulate_in_background
+
+    @simulate_in_background.setter
+    def simulate_in_background(self, value):
+        self._defer(self._set_simulate_in_background, value)
+
+    def _set_simulate_in_background(self, value):
+        self.simulation_worker.discard()
+        self._simulate_in_background = value
+
+    @property
+    @BOOLEAN("Simulate in a separate process (vectorized engine only): ")
+    def simulate_in_process(self):
+        return self.simulation_process is not None
+
+    @simulate_in_process.setter
+    def simulate_in_process(self, value):
+        self._defer(self._set_simulate_in_process, value)
+
+    def _set_simulate_in_process(self, value):
+        if value and self.simulation_process is None:
+            if not self._use_vector_engine:
+                logger.info("Simulating in a separate process needs the vectorized engine")
+                return
+            self.start_simulation_process()
+        elif not value and self.simulation_process is not None:
+            self.stop_simulation_process()
+
     # Terminal commands
 
     @terminal_command("Set the time rate")
     def speed(self, rate: float):
         self._time_rate = float(rate)
 
+    @terminal_command(f"Set the orbit mode of the vectorized engine ({', '.join(INTEGRATION_MODES)})")
+    def orbit_mode(self, mode: str):
+        if mode not in INTEGRATION_MODES:
+            logger.error(f"Unknown orbit mode {mode!r}. Valid modes are: {', '.join(INTEGRATION_MODES)}")
+            return
+        self.set_integration_mode(mode)
+
     @terminal_command("Enable planetary motion")
     def enable(self):
         self.state.planets_moving = True
@@ -195,11 +553,217 @@ class Newton(Mod):
     def disable(self):
         self.state.planets_moving = False
 
+    @terminal_command("List the upcoming events in the system")
+    def events(self, count: int = 5):
+        if not self._predict_events:
+            logger.info("Event prediction is not enabled")
+            return
+        upcoming = list(self.event_predictor.upcoming(int(count)))
+        if not upcoming:
+            logger.info("No upcoming events predicted")
+        for event in upcoming:
+            logger.info(self.describe_event(event))
+
+    @terminal_command("Show how often the frame budget has deferred writes and the time the fixed timestep dropped")
+    def budget(self):
+        logger.info(self.frame_governor.summary())
+        if self._use_fixed_timestep:
+            logger.info(self.fixed_timestep.summary())
+
+    @terminal_command("Show how many transform shifts each body has made and saved")
+    def shifts(self):
+        coalescer = self.shift_coalescer
+        for index in np.flatnonzero(coalescer.issued + coalescer.saved).tolist():
+            issued, saved = int(coalescer.issued[index]), int(coalescer.saved[index])
+            logger.info(
+                f"Body {index}: {issued} shifts, {saved} saved "
+                f"({100 * saved / (issued + saved):.1f}%)"
+            )
+
     # Functions to handle planetary stuff.
 
+    def _sync_planet_times(self):
+        """ Copy the body times out of the orbit engine into the save state. """
+        self.simulation_worker.wait()
+        self._pull_process_times()
+        if self._use_vector_engine:
+            self.save_state.planet_times = self.orbit_engine.times.tolist()
+
+    def set_integration_mode(self, mode: str):
+        self.simulation_worker.discard()
+        self._pull_process_times()
+        self.orbit_engine.set_integration_mode(mode)
+        # The ephemeris is sampled from a specific orbit model.
+        if self._use_ephemeris:
+            self.build_ephemeris()
+        # The body times were shifted for the new mode, so are sent as they are
+        # rather than pulled back out of the process.
+        if self.simulation_process is not None:
+            self._send_bodies_to_process()
+
+    def fast_forward(self, elapsed: float):
+        """ Move every body forward along its orbit by `elapsed` seconds of
+        real time in one step.
+        """
+        elapsed *= self.time_rate
+        if elapsed <= 0:
+            return
+        self.simulation_worker.discard()
+        self._pull_process_times()
+        logger.info(f"Fast forwarding the orbits by {elapsed:.1f}s")
+        if self._use_vector_engine:
+            self.orbit_engine.fast_forward(elapsed)
+            self._sync_planet_times()
+            # The N-body simulation can't be jumped forward so restart it from
+            # where the orbits have got to.
+            if self._use_nbody:
+                self.build_nbody()
+            if self.simulation_process is not None:
+                self._send_bodies_to_process()
+        else:
+            for index, orb_params in enumerate(self.state.orbit_params):
+                t = self.save_state.planet_times[index] + elapsed
+                if orb_params is not None and orb_params.alpha > 0:
+                    # Keep the time within one period so it stays precise.
+                    t = math.fmod(t, math.tau / orb_params.alpha)
+                self.save_state.planet_times[index] = t
+        self.fixed_timestep.reset()
+        self.position_interpolator.reset()
+
+    def build_ephemeris(self):
+        """ Sample the orbits of all the known bodies into an ephemeris table. """
+        table = EphemerisTable.build(
+            self.orbit_engine,
+            self.newton_globals.ephemeris_budget,
+            self.newton_globals.ephemeris_max_samples,
+        )
+        if table is None:
+            logger.warning(
+                f"Orbits do not fit in the ephemeris budget of {self.newton_globals.ephemeris_budget} bytes"
+            )
+        else:
+            logger.debug(f"Built ephemeris for the system using {table.nbytes} bytes")
+        self.orbit_engine.ephemeris = table
+
+    def build_nbody(self):
+        """ Start an N-body simulation of the known bodies from their current
+        positions along their orbits.
+        """
+        mu, unbound = body_masses(self.orbit_engine, *self.nbody_mass_settings())
+        if unbound:
+            logger.debug(f"The moons {unbound} would not stay bound so follow their orbits instead")
+        self.nbody_engine = NBodyEngine.from_orbit_engine(
+            self.orbit_engine,
+            STAR_MU,
+            mu,
+            unbound,
+            max_step=self.newton_globals.nbody_max_step,
+        )
+
+    def nbody_mass_settings(self) -> tuple[float, float, float, float, float]:
+        """ The arguments of `body_masses` after the orbit engine. """
+        return (
+            STAR_MU,
+            STAR_MU * self.newton_globals.nbody_planet_mass_ratio,
+            STAR_MU * self.newton_globals.nbody_moon_mass_ratio,
+            self.newton_globals.nbody_hill_fraction,
+            self.newton_globals.nbody_max_mass_ratio,
+        )
+
+    def start_simulation_process(self):
+        """ Start simulating in a separate process from where the orbit engine
+        has got to.
+        """
+        self.simulation_worker.discard()
+        process = SimulationProcess(self.orbit_engine.capacity, self.newton_globals.process_tick_rate)
+        process.start()
+        self.simulation_process = process
+        self._process_commands = {}
+        self._send_bodies_to_process()
+        logger.info("Started the simulation process")
+
+    def stop_simulation_process(self):
+        """ Stop the simulation process and carry on in this one from where
+        it got to.
+        """
+        self._pull_process_times()
+        process, self.simulation_process = self.simulation_process, None
+        process.stop()
+        if process.torn_reads:
+            logger.debug(f"The simulation process was mid-write for {process.torn_reads} reads")
+        if self._use_nbody:
+            self.build_nbody()
+        self.position_interpolator.reset()
+        logger.info("Stopped the simulation process")
+
+    def _pull_process_times(self):
+        """ Copy the latest body times out of the simulation process into the
+        orbit engine.
+        """
+        process = self.simulation_process
+        if process is None:
+            return
+        process.read()
+        if process.has_output:
+            self.orbit_engine.set_times(process.times)
+
+    def _send_bodies_to_process(self):
+        """ Send every orbit and the current body times to the simulation
+        process.
+        """
+        settings = {}
+        if self._use_ephemeris:
+            settings["ephemeris"] = (
+                self.newton_globals.ephemeris_budget,
+                self.newton_globals.ephemeris_max_samples,
+            )
+        if self._use_nbody:
+            settings["nbody"] = (*self.nbody_mass_settings(), self.newton_globals.nbody_max_step)
+        self.simulation_process.send(
+            COMMAND_BODIES,
+            [None if params is None else tuple(params) for params in self.state.orbit_params],
+            list(self.state.parent_planet_map),
+            self.orbit_engine.times.tolist(),
+            self.orbit_engine.integration_mode,
+            settings,
+        )
+
+    def _reload_simulation_process(self):
+        """ Restart the simulation in the process with the current settings. """
+        if self.simulation_process is not None:
+            self._pull_process_times()
+            self._send_bodies_to_process()
+
+    def _send_to_process(self, *command):
+        """ Send a command to the simulation process unless it is the same as
+        the last one of its kind.
+        """
+        if self._process_commands.get(command[0]) != command:
+            self._process_commands[command[0]] = command
+            self.simulation_process.send(*command)
+
+    def get_body_position(
+        self,
+        center: basic.Vector3f,
+        index: int,
+        orb_params: orbitParams,
+        t: float,
+    ) -> basic.Vector3f:
+        """ Get the position of a body at the given time around the provided
+        center, using the orbit model of the orbit engine if it is in use.
+        """
+        if self._use_vector_engine:
+            return center + basic.Vector3f(*self.orbit_engine.offset_at(index, t).tolist())
+        return get_position_ellipse(center, orb_params, t, self.state.orbit_orientations[index])
+
     def update_gravity_center(self, index: int, new_position: basic.Vector3f):
         if self.state.grav_singleton is not None:
-            center = self.state.grav_singleton.maGravityPoints[index].mCenter
+            points = self.state.grav_singleton.maGravityPoints
+            # The game only has a fixed number of gravity points, which may be
+            # fewer than the bodies we can hold.
+            if index >= len(points):
+                return
+            center = points[index].mCenter
             center.x = new_position.x
             center.y = new_position.y
             center.z = new_position.z
@@ -211,58 +775,67 @@ class Newton(Mod):
             delta = new_position - planet.mPosition
             planet.mPosition = new_position
             planet.mRegionMap.mMatrix.pos = new_position
-            engine.ShiftAllTransformsForNode(handle, delta)
-            self.update_gravity_center(index, new_position)
-
-    def generate_orbit_params(self, index: int, is_moon: bool):
-        """ Generate the orbit parameters for the provided index. """
-        random.seed(self.state.planet_seeds[index])
-        delta = random.random() * math.tau
-        epsilon = 0
-        variance = 0.1 * self.newton_globals.avg_planet_separation
-
-        # Determine the eccentricity of the orbit.
-        if is_moon:
-            epsilon = random.uniform(
-                self.newton_globals.min_moon_epsilon,
-                self.newton_globals.max_moon_epsilon
-            )
-        else:
-            epsilon = random.uniform(
-                self.newton_globals.min_planet_epsilon,
-                self.newton_globals.max_planet_epsilon
-            )
-
-        # Determine the semi-minor axis first as we want this to be always clear
-        # of the previous orbit.
-        if is_moon:
-            parent_planet = self.state.planets[self.state.parent_planet_map[index]]
-            if parent_planet is not None:
-                try:
-                    parent_planet_radius = parent_planet.mRegionMap.mfCachedRadius
-                    logger.debug(f"Parent planet radius: {parent_planet_radius}")
-                    b = random.uniform(
-                        1.75 * parent_planet_radius,
-                        2.25 * parent_planet_radius
-                    )
-                except Exception:
-                    logger.exception("There was an issue getting the planet radii")
-                    b = (index + 1) * self.newton_globals.avg_planet_separation + variance * random.uniform(-1, 1)
+            if self._coalesce_shifts:
+                # The nearest body is always shifted straight away as the
+                # player may be close enough to notice.
+                shift = self.shift_coalescer.add(
+                    index,
+                    delta.x,
+                    delta.y,
+                    delta.z,
+                    index == self.nearest_planet_index,
+                )
+                if shift is not None:
+                    engine.ShiftAllTransformsForNode(handle, basic.Vector3f(*shift))
             else:
-                b = (index + 1) * self.newton_globals.avg_planet_separation + variance * random.uniform(-1, 1)
-        else:
-            b = (index + 1) * self.newton_globals.avg_planet_separation + variance * random.uniform(-1, 1)
+                engine.ShiftAllTransformsForNode(handle, delta)
+            self.update_gravity_center(index, new_position)
+            self.body_positions[index] = (new_position.x, new_position.y, new_position.z)
+
+    def flush_shifts(self):
+        """ Make every transform shift which has been held back. """
+        for index, shift in self.shift_coalescer.pending():
+            if (handle := self.state.planet_handles[index]) is not None:
+                engine.ShiftAllTransformsForNode(handle, basic.Vector3f(*shift))
+
+    def occlusion_query(self, point, ignore: int = -1) -> np.ndarray:
+        """ Determine which bodies block the view of the star and of each other
+        from the given point (eg. the player or a space station).
+        See `occlusion.occlusions` for the layout of the result.
+        """
+        center = self.save_state.solar_system_center
+        return occlusions(
+            point,
+            self.body_positions,
+            self.body_radii,
+            self._body_known,
+            (center.x, center.y, center.z),
+            ignore=ignore,
+        )
 
-        # Then calculate the semi-major axis from the eccentricity.
-        a = b / math.sqrt(1 - epsilon * epsilon)
+    def occluders_of(self, point, target: Optional[int] = None, ignore: int = -1) -> list[int]:
+        """ Return the indexes of the bodies which block the view of the star
+        (or of the body with index `target`) from the given point.
+        """
+        return occluders(self.occlusion_query(point, ignore), target)
 
-        # TODO: Make the mass a property of the planet based on its size.
-        # TODO: Also do some maths to make the system more "caring" about the
-        # mass of stuff. Eg add a mass for the sun and then base the periods off
-        # this.
-        # Do the same with planets.
-        alpha = 3500000.0 / (math.tau * a ** 1.5)
-        return orbitParams(a, b, alpha, delta)
+    def parent_planet_radius(self, index: int) -> Optional[float]:
+        """ Return the radius of the planet the body with the given index
+        orbits, or None if it is a planet or the radius isn't known.
+        """
+        parent_planet_index = self.state.parent_planet_map[index]
+        if parent_planet_index == -1:
+            return None
+        parent_planet = self.state.planets[parent_planet_index]
+        if parent_planet is None:
+            return None
+        try:
+            parent_planet_radius = parent_planet.mRegionMap.mfCachedRadius
+        except Exception:
+            logger.exception("There was an issue getting the planet radii")
+            return None
+        logger.debug(f"Parent planet radius: {parent_planet_radius}")
+        return parent_planet_radius
 
     # This is stupid but one of these 3 will get it...
 
@@ -290,20 +863,55 @@ class Newton(Mod):
     @nms.cGcApplicationLocalLoadState.GetRespawnReason.after
     def after_respawn(self, this, _result_):
         logger.debug(f"Starting to move the planets... Reason: {enums.RespawnReason(_result_).name}")
+        self.start_system()
+
+    def start_system(self):
+        """ Generate the orbits of the system's bodies and start moving them,
+        if that hasn't been done already.
+        """
+        if not self.state.loaded_enough:
+            self.generate_system_orbits()
         self.state.loaded_enough = True
 
-    def _format_planet_period(self, period: float) -> str:
-        # Generate the string representation of the planet periods now so we can
-        # just display them later
-        # TODO: Just use HH:mm notation...
-        suffix = "seconds"
-        if 60 < period < 3600:
-            suffix = "minutes"
-            period = period / 60
-        elif period >= 3600:
-            suffix = "hours"
-            period = period / 3600
-        return f"{period:.2f} {suffix}"
+    @nms.cGcSolarSystem.Generate.before
+    def before_system_generate(self, this: ctypes._Pointer[nms.cGcSolarSystem], lbUseSettingsFile, lSeed):
+        # A new system is being generated (eg. after a warp), so forget the
+        # bodies of the last one and generate all the new orbits in one pass
+        # again once it has loaded.
+        self._solarsystem_data = this.contents.mSolarSystemData
+        # Write out the orbits of any bodies which were set up late in the last
+        # system while the loading screen hides the stall.
+        self.save_orbit_cache()
+        self.reset_system()
+
+    def reset_system(self):
+        """ Forget every body of the current system. The body times are kept. """
+        self.simulation_worker.discard()
+        self._pull_process_times()
+        state = self.state
+        state.loaded_enough = False
+        count = len(state.planets)
+        state.parent_planet_map[:] = [-1] * count
+        state.planet_periods[:] = [""] * count
+        state.orbit_params[:] = [None] * count
+        state.orbit_orientations[:] = [None] * count
+        state.planet_seeds[:] = [0] * count
+        state.planet_handles[:] = [None] * count
+        state.planets[:] = [None] * count
+        state.orbital_period_buffers[:] = [None] * count
+        times = self.orbit_engine.times.copy()
+        self.orbit_engine.clear()
+        self.orbit_engine.set_times(times)
+        self.body_positions[:] = 0
+        self.body_radii[:] = 0
+        self._body_known[:] = False
+        self.body_altitudes[:] = np.inf
+        self._nearest_planet_index = -1
+        self.update_scheduler.reset()
+        self.visibility.reset()
+        self.shift_coalescer.clear()
+        self.fixed_timestep.reset()
+        self._after_orbits_changed()
 
     @nms.cGcPlanet.SetupRegionMap.after
     def after_planet_setup(self, this: ctypes._Pointer[nms.cGcPlanet]):
@@ -311,47 +919,230 @@ class Newton(Mod):
         # Get some info about the planet and then store it so that we may access
         # it later.
         index = planet.miPlanetIndex
+        body_count = index + 1
+        # The system data is known from `before_system_generate`, so room is
+        # made for all of its bodies at once rather than one at a time.
+        if self._solarsystem_data is not None:
+            body_count = max(body_count, self._solarsystem_data.Planets)
+        self.ensure_body_capacity(body_count)
         self.state.planets[index] = planet
         self.state.planet_handles[index] = planet.mNode
+        # Anything held back was for the previous node.
+        self.shift_coalescer.forget(index)
         logger.debug(f"Planet is index {index} at position {planet.mPosition} with handle 0x{planet.mNode.lookupInt:X}")
-        if self._solarsystem_data is not None:
+        if self._solarsystem_data is not None and index < len(self._solarsystem_data.PlanetOrbits):
             parent_planet_index = self._solarsystem_data.PlanetOrbits[index]
         else:
             parent_planet_index = -1
 
         self.state.parent_planet_map[index] = parent_planet_index
 
-        if parent_planet_index == -1:
-            is_moon = False
-            self.state.planet_indexes.add(index)
-        else:
-            is_moon = True
-            self.state.moon_indexes.add(index)
-
         self.state.planet_seeds[index] = planet.mPlanetGenerationInputData.Seed.Seed
 
-        orb_params = self.generate_orbit_params(index, is_moon)
+        position = planet.mPosition
+        self.body_positions[index] = (position.x, position.y, position.z)
+        try:
+            self.body_radii[index] = planet.mRegionMap.mfCachedRadius
+            self._body_known[index] = True
+        except Exception:
+            logger.exception(f"Unable to get the radius of planet {index}")
+
+        # While the system is loading the orbits are all generated together once
+        # every body is known. Any bodies which show up after that are set up
+        # as they arrive. Their cache entries are written out with the next
+        # batch rather than rewriting the file for each one.
+        if self.state.loaded_enough:
+            self.setup_body_orbit(index)
+            self._after_orbits_changed()
+        elif (
+            self._solarsystem_data is not None
+            and sum(body is not None for body in self.state.planets) >= self._solarsystem_data.Planets
+        ):
+            # Every body of the new system is known, so start it without
+            # waiting on the respawn, which may not happen after a warp.
+            self.start_system()
+
+    def ensure_body_capacity(self, count: int):
+        """ Make room for at least `count` bodies in all the per-body state.
+
+        The orbit engine decides the new capacity (at least doubling it) and
+        everything else is grown to match, so that body indexes can be used
+        directly in the batched update paths.
+        """
+        if count <= len(self.state.planets):
+            return
+        # Nothing may still be running on the arrays about to be replaced.
+        self.simulation_worker.discard()
+        # The shared memory of the simulation process is sized for the old
+        # capacity so it is restarted.
+        restart_process = self.simulation_process is not None
+        if restart_process:
+            self.stop_simulation_process()
+        self.orbit_engine.ensure_capacity(count)
+        capacity = self.orbit_engine.capacity
+        extra = capacity - len(self.state.planets)
+        state = self.state
+        state.parent_planet_map.extend([-1] * extra)
+        state.planet_periods.extend([""] * extra)
+        state.orbit_params.extend([None] * extra)
+        state.orbit_orientations.extend([None] * extra)
+        state.planet_seeds.extend([0] * extra)
+        state.planet_handles.extend([None] * extra)
+        state.planets.extend([None] * extra)
+        state.orbital_period_buffers.extend([None] * extra)
+        planet_times = self.save_state.planet_times
+        planet_times.extend([0] * (capacity - len(planet_times)))
+        self.body_positions = grow_array(self.body_positions, capacity)
+        self.body_radii = grow_array(self.body_radii, capacity)
+        self._body_known = grow_array(self._body_known, capacity, False)
+        self.body_altitudes = grow_array(self.body_altitudes, capacity, np.inf)
+        self.position_interpolator.grow(capacity)
+        self.simulation_worker.resize(capacity)
+        self.update_scheduler.grow(capacity)
+        self.frame_governor.grow(capacity)
+        self.visibility.grow(capacity)
+        self.shift_coalescer.grow(capacity)
+        self._after_orbits_changed()
+        if restart_process:
+            self.start_simulation_process()
+        logger.debug(f"Grew the body storage to {capacity} bodies")
+
+    def make_update_scheduler(self, capacity: int) -> UpdateScheduler:
+        return UpdateScheduler(
+            capacity,
+            self.newton_globals.decimation_threshold,
+            self.newton_globals.decimation_max_interval,
+            self.newton_globals.decimation_max_updates,
+        )
+
+    def make_visibility_tracker(self, capacity: int) -> VisibilityTracker:
+        return VisibilityTracker(
+            capacity,
+            self.newton_globals.visibility_view_angle,
+            self.newton_globals.visibility_draw_distance,
+            self.newton_globals.visibility_gravity_interval,
+        )
+
+    def body_order(self, known: list[bool]) -> list[int]:
+        """ Return the indexes of the known bodies, ordered by their depth in the
+        body tree so that every body comes after the one it orbits. Any bodies
+        whose parent isn't known come last.
+        """
+        known = np.array(known, dtype=bool)
+        levels = topological_levels(np.array(self.state.parent_planet_map), known)
+        order = np.concatenate([np.zeros(0, dtype=np.intp)] + levels).tolist()
+        return order + [index for index in np.flatnonzero(known).tolist() if index not in order]
+
+    def update_plan(self) -> UpdatePlan:
+        """ Return the plan for moving the bodies this frame, compiling a new
+        one if we have entered or left an orbit or the nearest body changed.
+        """
+        in_orbit = self.save_state.is_in_orbit
+        focus = self.nearest_planet_index
+        plan = self._update_plan
+        if plan is None or not plan.matches(in_orbit, focus):
+            plan = compile_update_plan(in_orbit, focus, self.state.parent_planet_map, self._body_order)
+            self._update_plan = plan
+            logger.debug(f"Compiled {plan}")
+        return plan
+
+    def generate_system_orbits(self):
+        """ Generate the orbits of every known body in the system in one pass.
+
+        Bodies are done in order of their depth in the body tree so that each
+        moon can use the size and position of the body it orbits.
+        """
+        indexes = self.body_order([planet is not None for planet in self.state.planets])
+        for index in indexes:
+            self.setup_body_orbit(index)
+        logger.debug(
+            f"Generated the orbits of {len(indexes)} bodies "
+            f"({self.orbit_cache.hits} cache hits, {self.orbit_cache.misses} misses this session)"
+        )
+        self._after_orbits_changed()
+        self.save_orbit_cache()
+
+    def save_orbit_cache(self):
+        """ Write out any new cache entries. This is only done at points where
+        a short stall doesn't matter, as the whole file is rewritten.
+        """
+        try:
+            self.orbit_cache.save()
+        except OSError:
+            logger.exception("Unable to save the orbit cache")
+
+    def _after_orbits_changed(self):
+        """ Rebuild anything derived from the full set of orbits. """
+        self.simulation_worker.discard()
+        self._body_order = self.body_order([params is not None for params in self.state.orbit_params])
+        self._update_plan = None
+        if self._use_ephemeris:
+            self.build_ephemeris()
+        if self._use_nbody:
+            self.build_nbody()
+        # Don't interpolate from wherever the bodies were before.
+        self.position_interpolator.reset()
+        self.event_predictor.reset()
+        if self.simulation_process is not None:
+            self._send_bodies_to_process()
+
+    def setup_body_orbit(self, index: int):
+        """ Generate the orbit of the body with the given index and move it to
+        its current position along it.
+        """
+        self.simulation_worker.discard()
+        self._pull_process_times()
+        parent_planet_index = self.state.parent_planet_map[index]
+        is_moon = parent_planet_index != -1
+        seed = self.state.planet_seeds[index]
+        parent_planet_radius = self.parent_planet_radius(index)
+        cache_key = orbit_cache_key(
+            seed,
+            self.newton_globals,
+            index,
+            parent_planet_index,
+            parent_planet_radius,
+        )
+        cached = self.orbit_cache.get(cache_key)
+        if cached is not None:
+            orb_params, period_string = cached
+        else:
+            orb_params = generate_orbit_params(
+                seed,
+                index,
+                is_moon,
+                self.newton_globals,
+                parent_planet_radius,
+            )
+            period_string = format_period(math.tau / orb_params.alpha)
+            self.orbit_cache.put(cache_key, orb_params, period_string)
         self.state.orbit_params[index] = orb_params
-        period = math.tau / orb_params.alpha
+        self.state.orbit_orientations[index] = orbit_orientation(orb_params.inclination, orb_params.node)
+        self.orbit_engine.set_body(index, orb_params, parent_planet_index)
+        if self._use_vector_engine:
+            self.save_state.planet_times[index] = float(self.orbit_engine.times[index])
 
-        self.state.planet_periods[index] = self._format_planet_period(period)
+        self.state.planet_periods[index] = period_string
         self.state.orbital_period_buffers[index] = ctypes.create_string_buffer(
             f"Orbital Period: {self.state.planet_periods[index]}".encode()
         )
 
         if is_moon:
-            parent_planet = self.state.planets[parent_planet_index]
-            if parent_planet is not None:
-                parent_planet_pos = parent_planet.mPosition
-                pos = get_position_ellipse(
+            # The last known position of the parent, which is kept up to date
+            # as it moves.
+            if self._body_known[parent_planet_index]:
+                parent_planet_pos = basic.Vector3f(*self.body_positions[parent_planet_index].tolist())
+                pos = self.get_body_position(
                     parent_planet_pos,
+                    index,
                     orb_params,
                     self.save_state.planet_times[index],
                 )
                 self.move_planet(index, pos)
         else:
-            pos = get_position_ellipse(
+            pos = self.get_body_position(
                 self.save_state.solar_system_center,
+                index,
                 orb_params,
                 self.save_state.planet_times[index],
             )
@@ -379,14 +1170,44 @@ class Newton(Mod):
             # If the panel is not visible, then we don't need to do anything else.
             return
 
-        text = self.state.orbital_period_buffers[self._cached_hud.miSelectedPlanet]
+        selected_planet = self._cached_hud.miSelectedPlanet
+        text = self.state.orbital_period_buffers[selected_planet]
         # If the period is empty show nothing.
         # TODO: Disable the text field so nothing shows.
         if not text:
             return
+        if self._predict_events and self._use_vector_engine:
+            text = self._event_hud_buffer_for(selected_planet) or text
 
         self._cached_period_text_element.mpTextData.contents.Text.set(text)
 
+    def describe_event(self, event: orbitEvent) -> str:
+        """ Return a short human readable description of the event. """
+        when = format_duration(self.event_predictor.time_until(event))
+        if event.kind == EVENT_CLOSEST_APPROACH:
+            return f"Closest approach of bodies {event.first} and {event.second} in {when}"
+        if event.kind == EVENT_ALIGNMENT:
+            return f"Alignment of planets {event.first} and {event.second} in {when}"
+        return f"Eclipse by body {event.second} in {when}"
+
+    def _event_hud_buffer_for(self, index: int) -> Optional[ctypes.Array[ctypes.c_char]]:
+        """ Return the HUD text for the body with the next event involving it.
+        The buffer is only recreated when the text changes.
+        """
+        event = self.event_predictor.next_event(body=index)
+        if event is None:
+            return None
+        text = f"Orbital Period: {self.state.planet_periods[index]} | {self.describe_event(event)}"
+        if text != self._event_hud_text:
+            self._event_hud_text = text
+            self._event_hud_buffer = ctypes.create_string_buffer(text.encode())
+        return self._event_hud_buffer
+
+    def _update_events(self):
+        """ Keep the predicted events up to date with the orbit engine. """
+        self.event_predictor.set_observer(self.nearest_planet_index)
+        self.event_predictor.update()
+
     def start_moving_planets(self):
         logger.debug("Planets starting to move...")
         self.state.planets_moving = True
@@ -399,14 +1220,63 @@ class Newton(Mod):
     @property
     def nearest_planet_index(self) -> int:
         # Return the index of the nearest planet
-        if gameData.player_environment is not None:
-            return gameData.player_environment.miNearestPlanetIndex
-        return -1
+        return self._nearest_planet_index
+
+    @property
+    def player_position(self) -> Optional[tuple[float, float, float]]:
+        if (player := gameData.player) is not None:
+            pos = player.mPosition
+            return (pos.x, pos.y, pos.z)
+        return None
+
+    @property
+    def player_facing(self) -> Optional[tuple[float, float, float]]:
+        """ The direction the player is facing. The camera's direction isn't
+        known, but it is never far from this.
+        """
+        if (player := gameData.player) is not None:
+            at = player.mGraphicsMatrix.at
+            return (at.x, at.y, at.z)
+        return None
+
+    def update_proximity(self):
+        """ Determine the nearest body to the player and how far above it they
+        are. This is computed from the positions Newton has moved the bodies
+        to, as the game's values can lag a frame behind. The game's values are
+        used if the player position or the bodies aren't known.
+        """
+        previous_index = self._nearest_planet_index
+        self._nearest_planet_index = -1
+        self._nearest_planet_distance = 0.0
+        player_position = self.player_position if self._use_simulated_proximity else None
+        if player_position is not None and self._body_known.any():
+            body_altitudes(
+                player_position,
+                self.body_positions,
+                self.body_radii,
+                self._body_known,
+                out=self.body_altitudes,
+            )
+            index = nearest_body(
+                self.body_altitudes,
+                previous_index,
+                self.newton_globals.nearest_body_hysteresis,
+            )
+            if index != -1:
+                self._nearest_planet_index = index
+                self._nearest_planet_distance = float(self.body_altitudes[index])
+                return
+        if (pe := gameData.player_environment) is not None:
+            self._nearest_planet_index = pe.miNearestPlanetIndex
+            self._nearest_planet_distance = pe.mfDistanceFromPlanet
 
     @nms.cGcSolarSystem.OnEnterPlanetOrbit.after
     def after_enter_orbit(self, *args):
         # When we enter the orbit, do a sanity check and then set the fixed
-        # planet position.
+        # planet position. A step already in flight was prepared with the body
+        # free to move, so it is thrown away rather than written.
+        self.simulation_worker.discard()
+        self.update_proximity()
         if self.state.planets_moving:
             if self.nearest_planet_index != -1:
                 self.save_state.is_in_orbit = True
@@ -421,6 +1291,8 @@ class Newton(Mod):
 
     @nms.cGcSolarSystem.OnLeavePlanetOrbit.after
     def after_exit_orbit(self, this, lbAnnounceOSD):
+        # As on entering, a step in flight was prepared with the body fixed.
+        self.simulation_worker.discard()
         self.save_state.fixed_center = self.save_state.solar_system_center
         self.save_state.fixed_planet_position = basic.Vector3f(0, 0, 0)
         self.save_state.is_in_orbit = False
@@ -429,93 +1301,253 @@ class Newton(Mod):
         """ Move all the planets in the system. """
         if not gameData.player_environment:
             return
-        nearest_planet_index = gameData.player_environment.miNearestPlanetIndex
+        if self._use_vector_engine:
+            self._move_all_planets_vectorized(delta)
+            return
+        plan = self.update_plan()
+        planet_times = self.save_state.planet_times
 
-        # If we are fully within the orbit of the nearest planet, then we will
-        # not move it and everything else moves.
-        if self.save_state.is_in_orbit:
-            planet_to_not_move = nearest_planet_index
-        else:
-            # Otherwise, everything will be moving in some way.
-            planet_to_not_move = -1
-
-        # If the nearest "planet" is actually a moon, we also need to slow down
-        # the parent planet.
-        planet_to_slow = -1
-        if nearest_planet_index in self.state.moon_indexes:
-            planet_to_slow = self.state.parent_planet_map[nearest_planet_index]
-
-        if planet_to_not_move == -1:
-            # Move all planets (some may be slowed down).
-            for idx in self.state.planet_indexes:
-                # If the planet index is equal to the one which needs to be slowed
-                # down due to getting close to its moon, do so now.
-                if idx == planet_to_slow:
-                    self.save_state.planet_times[idx] += self.time_modifier(nearest_planet_index) * delta
-                else:
-                    self.save_state.planet_times[idx] += self.time_modifier(idx) * delta
-                new_pos = get_position_ellipse(
-                    self.save_state.solar_system_center,
-                    self.state.orbit_params[idx],
-                    self.save_state.planet_times[idx],
-                )
-                self.move_planet(idx, new_pos)
-            for idx in self.state.moon_indexes:
-                self.save_state.planet_times[idx] += self.time_modifier(idx) * delta
-                if (parent_planet := self.state.planets[self.state.parent_planet_map[idx]]):
-                    new_pos = get_position_ellipse(
-                        parent_planet.mPosition,
-                        self.state.orbit_params[idx],
-                        self.save_state.planet_times[idx],
-                    )
-                    self.move_planet(idx, new_pos)
-        else:
+        if plan.fixed_index != -1:
             # To make the motion of other planets/moons look correct when on
             # another one, we need to move the center of the solar system in
             # the opposite motion to the motion of the body we are on.
-            if planet_to_not_move in self.state.planet_indexes:
-                expected_planet_pos = get_position_ellipse(
-                    self.save_state.fixed_center,
-                    self.state.orbit_params[planet_to_not_move],
-                    self.save_state.planet_times[planet_to_not_move] + delta
-                )
-            else:
-                # For a moon, move the solar system point as if it were the moon.
-                # This will be the extected postion of the parent + the expected
-                # position of the mooon.
-                expected_parent_pos = get_position_ellipse(
-                    self.save_state.fixed_center,
-                    self.state.orbit_params[self.state.parent_planet_map[planet_to_not_move]],
-                    self.save_state.planet_times[self.state.parent_planet_map[planet_to_not_move]] + delta,
-                )
+            # For a moon, move the solar system point as if it were the moon.
+            # This will be the expected position of everything it orbits + the
+            # expected position of the moon.
+            expected_planet_pos = self.save_state.fixed_center
+            for idx in plan.fixed_chain:
                 expected_planet_pos = get_position_ellipse(
-                    expected_parent_pos,
-                    self.state.orbit_params[planet_to_not_move],
-                    self.save_state.planet_times[planet_to_not_move] + delta
+                    expected_planet_pos,
+                    self.state.orbit_params[idx],
+                    planet_times[idx] + delta,
+                    self.state.orbit_orientations[idx],
                 )
             self.save_state.solar_system_center = self.save_state.fixed_center - expected_planet_pos + self.save_state.fixed_planet_position
 
-            # Don't add the time modifier since we are on a planet (or close
-            # enough it's not moving...)
-            for idx in self.state.planet_indexes:
-                self.save_state.planet_times[idx] += delta
-                if idx != planet_to_not_move:
-                    new_pos = get_position_ellipse(
-                        self.save_state.solar_system_center,
-                        self.state.orbit_params[idx],
-                        self.save_state.planet_times[idx],
-                    )
-                    self.move_planet(idx, new_pos)
-            for idx in self.state.moon_indexes:
-                self.save_state.planet_times[idx] += delta
-                if idx != planet_to_not_move:
-                    if (parent_planet := self.state.planets[self.state.parent_planet_map[idx]]):
-                        new_pos = get_position_ellipse(
-                            parent_planet.mPosition,
-                            self.state.orbit_params[idx],
-                            self.save_state.planet_times[idx],
-                        )
-                        self.move_planet(idx, new_pos)
+        # The time step of each rate in the plan. Nothing is slowed down when
+        # we are on a body.
+        steps = (delta, self.time_modifier(plan.focus) * delta if plan.slowed else delta)
+        # Positions of the bodies computed this frame, so that each body can
+        # be placed around the new position of the body it orbits.
+        positions: dict[int, basic.Vector3f] = {}
+        moved = []
+        solar_system_center = self.save_state.solar_system_center
+        for idx, center, rate in plan.steps:
+            planet_times[idx] += steps[rate]
+            if center == CENTER_FIXED:
+                positions[idx] = basic.Vector3f(*self.body_positions[idx].tolist())
+                continue
+            positions[idx] = get_position_ellipse(
+                solar_system_center if center == CENTER_STAR else positions[center],
+                self.state.orbit_params[idx],
+                planet_times[idx],
+                self.state.orbit_orientations[idx],
+            )
+            moved.append(idx)
+        self.write_bodies(moved, positions.__getitem__)
+
+    def _move_all_planets_vectorized(self, delta: float):
+        """ Move all the planets in the system using the orbit engine, or the
+        N-body simulation if it is in use.
+        This follows the same logic as `move_all_planets`, but the times and
+        positions of every body are computed in one batched pass.
+        """
+        if self.simulation_process is not None:
+            self._update_simulation_process(delta)
+            return
+        if self._simulate_in_background:
+            # Write the positions the worker computed since the last frame, and
+            # set it going on the next ones.
+            worker = self.simulation_worker
+            result = worker.swap()
+            if result is not None:
+                self._apply_positions(*result)
+            worker.submit(self._prepare_step(delta))
+            return
+        positions, planet_to_not_move = self._step_vectorized(delta)
+        self._apply_positions(positions, planet_to_not_move)
+
+    def _update_simulation_process(self, delta: float):
+        """ Tell the simulation process about any changes in what it should
+        do, pass on the time this frame moves the simulation by, and write the
+        latest positions it has published to the game.
+        """
+        plan = self.update_plan()
+        slowed_rate = self.time_modifier(plan.focus) if plan.slowed else 1.0
+        self._send_to_process(COMMAND_RATES, list(plan.slowed), slowed_rate)
+        fixed_position = None
+        if plan.fixed_index != -1 and (fixed_planet := self.state.planets[plan.fixed_index]):
+            pos = fixed_planet.mPosition
+            fixed_position = (pos.x, pos.y, pos.z)
+        fixed_planet_position = self.save_state.fixed_planet_position
+        # The process moves the center itself while a body is fixed.
+        center = None
+        if plan.fixed_index == -1:
+            center = self.save_state.solar_system_center
+            center = (center.x, center.y, center.z)
+        self._send_to_process(
+            COMMAND_FIXED,
+            plan.fixed_index,
+            list(plan.fixed_chain),
+            (fixed_planet_position.x, fixed_planet_position.y, fixed_planet_position.z),
+            fixed_position,
+            center,
+        )
+        process = self.simulation_process
+        if delta > 0:
+            process.advance(delta)
+        if process.read():
+            self.save_state.solar_system_center = basic.Vector3f(*process.center)
+            self._apply_positions(process.positions, process.fixed_index)
+
+    def _step_vectorized(self, delta: float) -> tuple[np.ndarray, int]:
+        """ Advance the vectorized simulation by `delta` and compute the new
+        positions of every body without writing them to the game.
+        Returns the positions and the index of the body which is not to be
+        moved (or -1).
+        """
+        return self._run_step(self._prepare_step(delta))
+
+    def _prepare_step(self, delta: float) -> stepJob:
+        """ Read everything the next step needs from the game. This has to run
+        on the main thread, unlike the step itself.
+        """
+        plan = self.update_plan()
+        if self._use_nbody and self.nbody_engine is not None:
+            # Bodies can't be slowed down individually under mutual gravity, so
+            # when approaching a body the whole system is slowed down instead.
+            if plan.slowed:
+                delta *= self.time_modifier(plan.focus)
+            return stepJob(delta, True, None, plan.fixed_index, None)
+        orbit_engine = self.orbit_engine
+
+        planet_to_not_move = plan.fixed_index
+        fixed_position = None
+        orbit_engine.rates[:] = 1
+        if planet_to_not_move != -1:
+            # We are on (or very near) a body so it stays where it is and the
+            # solar system center moves in the opposite direction instead.
+            times = orbit_engine.times
+            offset = np.zeros(3)
+            for idx in plan.fixed_chain:
+                offset += orbit_engine.offset_at(idx, times[idx] + delta)
+            expected_planet_pos = self.save_state.fixed_center + basic.Vector3f(*offset.tolist())
+            self.save_state.solar_system_center = self.save_state.fixed_center - expected_planet_pos + self.save_state.fixed_planet_position
+            if (fixed_planet := self.state.planets[planet_to_not_move]):
+                pos = fixed_planet.mPosition
+                fixed_position = (pos.x, pos.y, pos.z)
+        elif plan.slowed:
+            # Slow down the nearest body, and everything it orbits if it is a moon.
+            orbit_engine.rates[plan.slowed] = self.time_modifier(plan.focus)
+
+        center = self.save_state.solar_system_center
+        return stepJob(delta, False, (center.x, center.y, center.z), planet_to_not_move, fixed_position)
+
+    def _run_step(self, job: stepJob) -> tuple[np.ndarray, int]:
+        """ Advance the simulation as prepared by `_prepare_step`. This doesn't
+        read anything from the game so can run on the worker thread.
+        """
+        if job.nbody:
+            return self._step_nbody(job)
+        self.orbit_engine.advance(job.delta)
+        positions = self.orbit_engine.evaluate(job.center, job.fixed_index, job.fixed_position)
+        return positions, job.fixed_index
+
+    def _step_nbody(self, job: stepJob) -> tuple[np.ndarray, int]:
+        """ Advance the N-body simulation as prepared by `_prepare_step`. """
+        nbody_engine = self.nbody_engine
+        planet_to_not_move = job.fixed_index
+
+        # Keep the orbit times going so that a save made now is still sensible.
+        self.orbit_engine.rates[:] = 1
+        self.orbit_engine.advance(job.delta)
+        nbody_engine.step(job.delta)
+        positions = nbody_engine.relative_positions()
+
+        if planet_to_not_move != -1 and planet_to_not_move in nbody_engine.moved_indexes:
+            # Move the star so that the body we are on stays where it is.
+            self.save_state.solar_system_center = (
+                self.save_state.fixed_planet_position - basic.Vector3f(*positions[planet_to_not_move].tolist())
+            )
+        center = self.save_state.solar_system_center
+        return nbody_engine.positions_around((center.x, center.y, center.z)), planet_to_not_move
+
+    @property
+    def simulated_indexes(self) -> np.ndarray:
+        """ The indexes of the bodies moved by the vectorized simulation. """
+        if self._use_nbody and self.nbody_engine is not None:
+            return self.nbody_engine.moved_indexes
+        return self.orbit_engine.body_indexes
+
+    def _apply_positions(self, positions: np.ndarray, planet_to_not_move: int):
+        """ Write the positions computed by the vectorized simulation to the game. """
+        indexes = self.simulated_indexes
+        if planet_to_not_move != -1:
+            indexes = indexes[indexes != planet_to_not_move]
+        player_position = self.player_position
+        appeared = None
+        if self._skip_hidden_bodies and player_position is not None:
+            # Hidden bodies are left where they are in the game, apart from
+            # their gravity points which are kept roughly up to date. A body
+            # which comes into view is moved to its exact position at once.
+            visibility = self.visibility
+            visibility.update(
+                player_position,
+                self.player_facing,
+                positions,
+                self.body_radii,
+                indexes,
+                self.nearest_planet_index,
+                self.nearest_planet_index,
+            )
+            for idx in visibility.gravity_due(indexes).tolist():
+                self.update_gravity_center(idx, basic.Vector3f(*positions[idx].tolist()))
+            appeared = indexes[visibility.appeared[indexes]]
+            indexes = indexes[visibility.visible[indexes] & ~visibility.appeared[indexes]]
+        if self._decimate_updates and player_position is not None:
+            indexes = self.update_scheduler.select(
+                indexes,
+                positions,
+                self.body_positions,
+                player_position,
+                self.nearest_planet_index,
+            )
+        if appeared is not None and len(appeared):
+            indexes = np.concatenate([appeared, indexes])
+        self.write_bodies(indexes.tolist(), lambda idx: basic.Vector3f(*positions[idx].tolist()))
+
+    def write_bodies(self, indexes: list[int], position_of: Callable[[int], basic.Vector3f]):
+        """ Move the given bodies to their new positions in the game. With the
+        frame budget on, the nearest body is moved first and any bodies which
+        don't fit in the budget are left until the next frame.
+        """
+        if self._use_frame_budget:
+            self.frame_governor.run(
+                indexes,
+                lambda idx: self.move_planet(idx, position_of(idx)),
+                self.nearest_planet_index,
+            )
+            return
+        for idx in indexes:
+            self.move_planet(idx, position_of(idx))
+
+    def _move_all_planets_fixed_step(self, frame_time: float):
+        """ Advance the vectorized simulation in fixed ticks and move the
+        planets to positions interpolated between the last two ticks.
+        """
+        if not gameData.player_environment:
+            return
+        timestep = self.fixed_timestep
+        for _ in range(timestep.add(frame_time)):
+            positions, self._fixed_step_planet_to_not_move = self._step_vectorized(
+                self.time_rate * timestep.tick
+            )
+            self.position_interpolator.push(positions)
+        if self.position_interpolator.ready:
+            self._apply_positions(
+                self.position_interpolator.blend(timestep.alpha),
+                self._fixed_step_planet_to_not_move,
+            )
 
     def time_modifier(self, index: int) -> float:
         """ Return a time modifier based on the planet index.
@@ -524,23 +1556,14 @@ class Newton(Mod):
         pe = gameData.player_environment
         if not pe:
             return 0
-        if index == pe.miNearestPlanetIndex:
+        if index == self.nearest_planet_index:
             if (planet := self.state.planets[index]):
-                dist = pe.mfDistanceFromPlanet / 1000.0
+                dist = self._nearest_planet_distance / 1000.0
                 # Far point. Beyond this the rate will be 1
                 far = 10 * planet.mpEnvProperties.contents.SkyAtmosphereHeight / 1000.0
                 # Near point, at this point and closer the rate will be 0
                 near = planet.mpEnvProperties.contents.AtmosphereEndHeight / 1000.0
-                if near < dist < far:
-                    n = self.newton_globals.approach_rate_dropoff
-                    a_n = near ** n
-                    val = (dist ** n - a_n) / (far ** n - a_n)
-                    v = min(max(val, 0), 1)
-                    return v
-                elif dist >= far:
-                    return 1
-                elif dist < near:
-                    return 0
+                return approach_rate(dist, near, far, float(self.newton_globals.approach_rate_dropoff))
         return 1
 
     @nms.cGcGameState.LoadFromPersistentStorage.after
@@ -548,7 +1571,18 @@ class Newton(Mod):
         # TODO: get the right save data.
         if gameData.GcApplication is not None:
             try:
+                self.simulation_worker.discard()
                 self.save_state.load(f"newton-{gameData.GcApplication.muPlayerSaveSlot}.json")
+                # The save may be from a system with a different number of bodies.
+                self.ensure_body_capacity(len(self.save_state.planet_times))
+                planet_times = self.save_state.planet_times
+                planet_times.extend([0] * (len(self.state.planets) - len(planet_times)))
+                if self._use_vector_engine:
+                    self.orbit_engine.set_times(self.save_state.planet_times)
+                    if self.simulation_process is not None:
+                        self._send_bodies_to_process()
+                if self._world_kept_turning and self.save_state.saved_at > 0:
+                    self.fast_forward(time.time() - self.save_state.saved_at)
             except NoSaveError:
                 pass
         else:
@@ -558,10 +1592,14 @@ class Newton(Mod):
     def after_save_data(self, *args):
         if gameData.GcApplication is not None:
             logger.info(f"Saved to slot {gameData.GcApplication.muPlayerSaveSlot}")
+            self._sync_planet_times()
+            self.save_state.saved_at = time.time()
             self.save_state.save(f"newton-{gameData.GcApplication.muPlayerSaveSlot}.json")
+            self.save_orbit_cache()
 
     @nms.cGcApplication.Update.before
     def run_main_loop(self, this):
+        self._apply_pending_changes()
         if not self.run:
             return
         if gameData.GcApplication is not None:
@@ -570,8 +1608,26 @@ class Newton(Mod):
                 return
         if self.state.loaded_enough and self.state.planets_moving:
             try:
-                delta = self.time_rate * self.lastRenderTimeMS
-                self.move_all_planets(delta)
+                self.frame_governor.start_frame()
+                # Let any step running in the background finish before anything
+                # here reads the simulation. It is swapped in as usual below.
+                self.simulation_worker.wait()
+                self.update_proximity()
+                # The predictions follow the orbits, which the N-body simulation
+                # doesn't. This is done before moving the bodies as the next step
+                # may then be running in the background.
+                if (
+                    self._predict_events
+                    and self._use_vector_engine
+                    and not self._use_nbody
+                    and self.simulation_process is None
+                ):
+                    self._update_events()
+                if self._use_vector_engine and self._use_fixed_timestep and self.simulation_process is None:
+                    self._move_all_planets_fixed_step(self.lastRenderTimeMS)
+                else:
+                    delta = self.time_rate * self.lastRenderTimeMS
+                    self.move_all_planets(delta)
             except Exception:
                 logger.exception("Error moving the planets")
                 self.run = False
@@ -0,0 +1,89 @@
+""" Line of sight queries between a point and the bodies of a solar system.
+
+Every body is treated as a sphere. A body occludes a target if it is closer to
+the viewer than the target and the two discs overlap as seen from the viewer,
+which for a point-like target is exactly a ray-sphere intersection test along
+the line of sight. All the pairs are tested in one batched pass.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+# Row of the star in the matrices returned by `occlusions`. Body `i` is row `i + 1`.
+STAR = 0
+
+
+def occlusions(
+    origin,
+    positions: np.ndarray,
+    radii: np.ndarray,
+    mask: np.ndarray,
+    star_position,
+    star_radius: float = 0.0,
+    ignore: int = -1,
+) -> np.ndarray:
+    """ Determine which bodies block the view of the star and of each other.
+
+    Returns a boolean array of shape `(n + 1, n)` where entry `[t, o]` is
+    whether body `o` occludes target `t`. Target 0 is the star and target
+    `i + 1` is body `i`. Only bodies in `mask` are considered, and the body with
+    index `ignore` (eg. the one the viewer is standing on) never occludes.
+    """
+    n = len(radii)
+    targets = np.empty((n + 1, 3))
+    targets[0] = star_position
+    targets[1:] = positions
+    targets -= origin
+    target_radii = np.empty(n + 1)
+    target_radii[0] = star_radius
+    target_radii[1:] = radii
+
+    dist = np.sqrt(np.einsum("ij,ij->i", targets, targets))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Angular radius of each sphere as seen from the origin. If the origin
+        # is inside a sphere it covers everything.
+        angular_radii = np.arcsin(np.minimum(target_radii / dist, 1.0))
+        directions = targets / dist[:, None]
+    # Angle between the direction of every target and every occluder.
+    cos_sep = directions @ directions[1:].T
+    sep = np.arccos(np.clip(cos_sep, -1.0, 1.0))
+
+    occluding = mask.copy()
+    if ignore != -1:
+        occluding[ignore] = False
+    result = (
+        occluding[None, :]
+        & (dist[1:][None, :] < dist[:, None])
+        & (sep < angular_radii[1:][None, :] + angular_radii[:, None])
+    )
+    # A body can't occlude itself, and hidden targets are still occluded.
+    result[np.arange(1, n + 1), np.arange(n)] = False
+    return result
+
+
+def occluders(result: np.ndarray, target: Optional[int] = None) -> list[int]:
+    """ Indexes of the bodies occluding the star (the default) or the body with
+    the given index, from the result of `occlusions`.
+    """
+    row = STAR if target is None else target + 1
+    return np.flatnonzero(result[row]).tolist()
+
+
+def hidden_behind(origin, positions: np.ndarray, radii: np.ndarray, occluder: int) -> np.ndarray:
+    """ Whether each body is completely hidden behind the body with index
+    `occluder` as seen from `origin`. This tests every body against the one
+    sphere, so is much cheaper than `occlusions` for many bodies.
+    """
+    offsets = positions - origin
+    dist = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        angular_radii = np.arcsin(np.minimum(radii / dist, 1.0))
+        directions = offsets / dist[:, None]
+    sep = np.arccos(np.clip(directions @ directions[occluder], -1.0, 1.0))
+    # The whole disc of the body lies within the disc of the occluder, and the
+    # body is further away.
+    hidden = (dist > dist[occluder]) & (sep + angular_radii <= angular_radii[occluder])
+    hidden[occluder] = False
+    return hidden
@@ -0,0 +1,153 @@
+""" Persistent cache of generated orbit parameters.
+
+Orbits are a deterministic function of the planet seed and the generation
+settings, so once a body has been seen its orbit parameters and the formatted
+period string can be stored and reused the next time the system is visited.
+
+The cache file is a small header followed by an index of the keys and then the
+fixed size records they refer to, both in least to most recently used order.
+"""
+
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import struct
+from typing import Optional
+
+from generation import NewtonGlobals, generation_settings
+from orbits import orbitParams
+
+
+logger = logging.getLogger("Newton")
+
+
+CACHE_MAGIC = b"NWOC"
+CACHE_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+# Planet seed and generation hash.
+_KEY = struct.Struct("<QQ")
+# The orbit parameters and the period string, padded with nulls.
+_PERIOD_LENGTH = 32
+_RECORD = struct.Struct(f"<6d{_PERIOD_LENGTH}s")
+
+CacheKey = tuple[int, int]
+
+
+def generation_hash(*inputs) -> int:
+    """ Return a stable 64 bit hash of the inputs to the orbit generation.
+
+    Python's builtin `hash` is randomised between runs so cannot be used for
+    anything which is written to disk.
+    """
+    digest = hashlib.blake2b(repr(inputs).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def orbit_cache_key(
+    seed: int,
+    newton_globals: NewtonGlobals,
+    index: int,
+    parent_planet_index: int,
+    parent_planet_radius: Optional[float],
+) -> CacheKey:
+    """ Return the key of a body in the orbit cache.
+
+    As well as the seed and the generation settings, the orbits depend on the
+    index of the body and, for moons, the radius of the parent planet. Only the
+    settings the generation reads are hashed, so that changing any of the
+    simulation settings doesn't throw the cache away.
+    """
+    return (
+        seed,
+        generation_hash(
+            generation_settings(newton_globals),
+            index,
+            parent_planet_index,
+            parent_planet_radius,
+        ),
+    )
+
+
+class OrbitCache:
+    """ Least recently used cache of orbit parameters, backed by a file. """
+    def __init__(self, path: str, max_entries: int = 4096):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, tuple[orbitParams, str]] = OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """ Size of the cache once written to disk. """
+        return _HEADER.size + len(self._entries) * (_KEY.size + _RECORD.size)
+
+    def get(self, key: CacheKey) -> Optional[tuple[orbitParams, str]]:
+        """ Return the orbit parameters and period string for the key, if cached. """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: CacheKey, params: orbitParams, period: str):
+        self._entries[key] = (params, period)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def load(self):
+        """ Read the cache file, replacing the current contents. A missing or
+        unreadable file leaves the cache empty.
+        """
+        self._entries.clear()
+        self._dirty = False
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        try:
+            magic, version, count = _HEADER.unpack_from(data)
+            if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                logger.info(f"Ignoring orbit cache {self.path} from a different version")
+                return
+            records_offset = _HEADER.size + count * _KEY.size
+            keys = _KEY.iter_unpack(data[_HEADER.size:records_offset])
+            records = _RECORD.iter_unpack(data[records_offset:records_offset + count * _RECORD.size])
+            for key, record in zip(keys, records):
+                period = record[6].rstrip(b"\x00").decode()
+                self._entries[key] = (orbitParams(*record[:6]), period)
+        except (struct.error, UnicodeDecodeError):
+            logger.warning(f"Orbit cache {self.path} is corrupt and will be rebuilt")
+            self._entries.clear()
+            return
+        # Drop the oldest entries if the size cap has been lowered.
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        logger.debug(f"Loaded {len(self._entries)} cached orbits")
+
+    def save(self):
+        """ Write the cache file if anything has changed since it was read. """
+        if not self._dirty:
+            return
+        parts = [_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(self._entries))]
+        parts.extend(_KEY.pack(*key) for key in self._entries)
+        parts.extend(
+            _RECORD.pack(*params, period.encode()[:_PERIOD_LENGTH])
+            for params, period in self._entries.values()
+        )
+        # Write to a temporary file first so a crash can't leave a partial cache.
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
@@ -0,0 +1,238 @@
+""" Precompute orbits for a large number of planet seeds outside of the game.
+
+The orbits are generated across all cores with a process pool and streamed to
+a directory of NPZ chunks, along with some summary statistics which are useful
+for tuning the generation settings. The results can also be used to pre-warm
+the orbit cache used by the mod.
+
+Examples:
+    python precompute.py --seeds 0:1000000 --index 0,1,2,3 --out orbits
+    python precompute.py --seed-file seeds.txt --set avg_planet_separation=250000 --out orbits
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, fields
+from functools import partial
+import json
+import math
+import os
+import os.path as op
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+
+from generation import NewtonGlobals, default_globals, format_period, generate_orbit_params
+from orbit_cache import OrbitCache, orbit_cache_key
+from orbits import orbitParams
+
+
+# Bins of log10(period) used to estimate the period percentiles.
+PERIOD_BINS = np.linspace(0, 8, 801)
+COLUMNS = ("seed", "index", "a", "b", "alpha", "delta", "inclination", "node", "period")
+
+
+def compute_chunk(
+    seeds: np.ndarray,
+    indexes: list[int],
+    newton_globals: NewtonGlobals,
+    parent_planet_index: int = -1,
+    parent_planet_radius: Optional[float] = None,
+) -> dict[str, np.ndarray]:
+    """ Generate the orbits of every seed at each of the given indexes. """
+    is_moon = parent_planet_index != -1
+    n = len(seeds) * len(indexes)
+    params = np.zeros((n, 6))
+    row = 0
+    for seed in seeds.tolist():
+        for index in indexes:
+            params[row] = generate_orbit_params(seed, index, is_moon, newton_globals, parent_planet_radius)
+            row += 1
+    chunk = {
+        "seed": np.repeat(seeds, len(indexes)),
+        "index": np.tile(np.array(indexes, dtype=np.int32), len(seeds)),
+    }
+    for i, name in enumerate(COLUMNS[2:8]):
+        chunk[name] = params[:, i]
+    chunk["period"] = math.tau / params[:, 2]
+    return chunk
+
+
+class Summary:
+    """ Statistics of the generated orbits, accumulated a chunk at a time. """
+    def __init__(self):
+        self.count = 0
+        self.period_min = math.inf
+        self.period_max = 0.0
+        self.period_sum = 0.0
+        self.a_min = math.inf
+        self.a_max = 0.0
+        self.eccentricity_sum = 0.0
+        self.eccentricity_max = 0.0
+        self.period_hist = np.zeros(len(PERIOD_BINS) - 1, dtype=np.int64)
+
+    def add(self, chunk: dict[str, np.ndarray]):
+        period, a = chunk["period"], chunk["a"]
+        e = np.sqrt(np.maximum(0, 1 - (chunk["b"] / a) ** 2))
+        self.count += len(period)
+        self.period_min = min(self.period_min, float(period.min()))
+        self.period_max = max(self.period_max, float(period.max()))
+        self.period_sum += float(period.sum())
+        self.a_min = min(self.a_min, float(a.min()))
+        self.a_max = max(self.a_max, float(a.max()))
+        self.eccentricity_sum += float(e.sum())
+        self.eccentricity_max = max(self.eccentricity_max, float(e.max()))
+        self.period_hist += np.histogram(np.log10(period), PERIOD_BINS)[0]
+
+    def period_percentile(self, q: float) -> float:
+        """ Approximate percentile of the periods, from the histogram. """
+        cumulative = np.cumsum(self.period_hist)
+        i = int(np.searchsorted(cumulative, q / 100 * cumulative[-1]))
+        return float(10 ** PERIOD_BINS[min(i + 1, len(PERIOD_BINS) - 1)])
+
+    def as_dict(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "period_min": self.period_min,
+            "period_median": self.period_percentile(50),
+            "period_p95": self.period_percentile(95),
+            "period_max": self.period_max,
+            "period_mean": self.period_sum / self.count,
+            "semi_major_axis_min": self.a_min,
+            "semi_major_axis_max": self.a_max,
+            "eccentricity_mean": self.eccentricity_sum / self.count,
+            "eccentricity_max": self.eccentricity_max,
+        }
+
+
+def parse_seeds(args) -> np.ndarray:
+    seeds = []
+    if args.seeds:
+        for part in args.seeds.split(","):
+            if ":" in part:
+                start, stop = part.split(":")
+                seeds.append(np.arange(int(start, 0), int(stop, 0), dtype=np.uint64))
+            else:
+                seeds.append(np.array([int(part, 0)], dtype=np.uint64))
+    if args.seed_file:
+        with open(args.seed_file) as f:
+            seeds.append(np.array([int(line, 0) for line in f if line.strip()], dtype=np.uint64))
+    if not seeds:
+        raise SystemExit("No seeds provided. Use --seeds and/or --seed-file.")
+    return np.concatenate(seeds)
+
+
+def parse_globals(overrides: list[str]) -> NewtonGlobals:
+    """ Apply `name=value` overrides to the default globals. """
+    newton_globals = default_globals()
+    types = {field.name: type(getattr(newton_globals, field.name)) for field in fields(NewtonGlobals)}
+    for override in overrides:
+        name, _, value = override.partition("=")
+        if name not in types:
+            raise SystemExit(f"Unknown global {name!r}. Valid globals are: {', '.join(types)}")
+        setattr(newton_globals, name, types[name](value))
+    return newton_globals
+
+
+def json_safe(value):
+    """ Replace the non-finite floats in `value` with None, as they are not
+    valid JSON.
+    """
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def chunked(seeds: np.ndarray, chunk_size: int) -> Iterator[np.ndarray]:
+    for start in range(0, len(seeds), chunk_size):
+        yield seeds[start:start + chunk_size]
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seeds", help="Comma separated seeds and start:stop ranges of seeds")
+    parser.add_argument("--seed-file", help="File with one seed per line")
+    parser.add_argument("--index", default="0", help="Comma separated body indexes to generate each seed at")
+    parser.add_argument("--parent-index", type=int, default=-1, help="Generate moons of the planet with this index")
+    parser.add_argument("--parent-radius", type=float, help="Radius of the parent planet of the moons")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a global")
+    parser.add_argument("--out", required=True, help="Directory to write the chunks and summary to")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="Seeds per chunk")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--warm-cache", metavar="PATH", help="Also add the orbits to the orbit cache at this path")
+    parser.add_argument("--cache-entries", type=int, default=4096, help="Size cap of the orbit cache")
+    args = parser.parse_args(argv)
+
+    seeds = parse_seeds(args)
+    indexes = [int(i) for i in args.index.split(",")]
+    newton_globals = parse_globals(args.set)
+    # The game stores the radius as a float, so round it the same way for the
+    # orbits and cache keys to match what the mod generates.
+    parent_radius = None if args.parent_radius is None else float(np.float32(args.parent_radius))
+    os.makedirs(args.out, exist_ok=True)
+
+    cache = None
+    if args.warm_cache:
+        cache = OrbitCache(args.warm_cache, args.cache_entries)
+        cache.load()
+
+    summary = Summary()
+    start_time = time.perf_counter()
+    n_chunks = math.ceil(len(seeds) / args.chunk_size)
+    with ProcessPoolExecutor(args.workers) as executor:
+        # map yields the chunks in the order they were submitted, not as they
+        # finish, so a slow chunk holds back the ones after it. Keeping the
+        # order means the chunk files are numbered by seed and the most recent
+        # orbits put into the cache are the last seeds. The earlier chunks are
+        # still written out while the later ones are being computed.
+        worker = partial(
+            compute_chunk,
+            indexes=indexes,
+            newton_globals=newton_globals,
+            parent_planet_index=args.parent_index,
+            parent_planet_radius=parent_radius,
+        )
+        results = executor.map(worker, chunked(seeds, args.chunk_size))
+        for i, chunk in enumerate(results):
+            np.savez(op.join(args.out, f"chunk-{i:05d}.npz"), **chunk)
+            summary.add(chunk)
+            if cache is not None:
+                # Only the most recent entries survive the size cap, so skip the
+                # rest of the chunk.
+                rows = range(max(0, len(chunk["seed"]) - args.cache_entries), len(chunk["seed"]))
+                for row in rows:
+                    cache.put(
+                        orbit_cache_key(
+                            int(chunk["seed"][row]),
+                            newton_globals,
+                            int(chunk["index"][row]),
+                            args.parent_index,
+                            parent_radius,
+                        ),
+                        orbitParams(*(float(chunk[name][row]) for name in COLUMNS[2:8])),
+                        format_period(float(chunk["period"][row])),
+                    )
+            print(f"Wrote chunk {i + 1}/{n_chunks} ({summary.count} orbits)", flush=True)
+    elapsed = time.perf_counter() - start_time
+
+    stats = summary.as_dict()
+    stats["elapsed_seconds"] = elapsed
+    stats["globals"] = asdict(newton_globals)
+    with open(op.join(args.out, "summary.json"), "w") as f:
+        json.dump(json_safe(stats), f, indent=2, allow_nan=False)
+    if cache is not None:
+        cache.save()
+    print(f"Generated {summary.count} orbits in {elapsed:.1f}s")
+    for name, value in summary.as_dict().items():
+        print(f"  {name}: {value:.6g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+""" Distance queries between a point and the bodies of a solar system. """
+
+from typing import Optional
+
+import numpy as np
+
+
+def body_altitudes(
+    point,
+    positions: np.ndarray,
+    radii: np.ndarray,
+    mask: np.ndarray,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """ Return the height of the point above the surface of every body in one
+    pass. Bodies which aren't in `mask` are infinitely far away.
+    """
+    if out is None:
+        out = np.empty(len(radii))
+    diff = positions - point
+    np.sqrt(np.einsum("ij,ij->i", diff, diff), out=out)
+    out -= radii
+    out[~mask] = np.inf
+    return out
+
+
+def nearest_body(altitudes: np.ndarray, current: int = -1, hysteresis: float = 0.0) -> int:
+    """ Index of the body with the lowest altitude, or -1 if none are known.
+
+    The `current` nearest body is kept unless another is nearer by more than
+    the fraction `hysteresis` of its altitude, so that the result doesn't flip
+    back and forth while the player is about as far from two bodies.
+    """
+    index = int(np.argmin(altitudes))
+    if altitudes[index] == np.inf:
+        return -1
+    if current != -1 and current < len(altitudes) and altitudes[current] != np.inf:
+        if altitudes[index] >= altitudes[current] - hysteresis * abs(altitudes[current]):
+            return current
+    return index
@@ -0,0 +1,85 @@
+""" Coalescing of the transform shifts which move bodies in the game.
+
+Shifting a body walks every transform in its node tree, which is the most
+expensive part of moving it. While a body moves by less than `threshold` its
+displacement is accumulated instead, and it is shifted by the total once that
+grows beyond the threshold or `max_age` moves have been held back. The logical
+position of the body is still updated every move, so only what is drawn lags
+behind, and by less than the threshold.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from orbits import grow_array
+
+
+class ShiftCoalescer:
+    """ Accumulate the displacement of each body until it is worth a shift. """
+    def __init__(self, capacity: int = 8, threshold: float = 0.5, max_age: int = 8):
+        # Distance in metres a body may be drawn away from where it is.
+        self.threshold = threshold
+        self.max_age = max_age
+        # Displacement not yet shifted, and the moves since the last shift.
+        self.residual = np.zeros((capacity, 3))
+        self.age = np.zeros(capacity, dtype=np.intp)
+        # Per body counts of the shifts made and saved.
+        self.issued = np.zeros(capacity, dtype=np.int64)
+        self.saved = np.zeros(capacity, dtype=np.int64)
+
+    def grow(self, capacity: int):
+        """ Make room for `capacity` bodies, keeping what is pending. """
+        if capacity <= len(self.age):
+            return
+        for name in ("residual", "age", "issued", "saved"):
+            setattr(self, name, grow_array(getattr(self, name), capacity))
+
+    def forget(self, index: int):
+        """ Drop anything pending for the body, eg. as its node has changed. """
+        self.residual[index] = 0
+        self.age[index] = 0
+
+    def clear(self):
+        """ Drop everything pending for every body. """
+        self.residual[:] = 0
+        self.age[:] = 0
+
+    def add(
+        self,
+        index: int,
+        dx: float,
+        dy: float,
+        dz: float,
+        force: bool = False,
+    ) -> Optional[tuple[float, float, float]]:
+        """ Add a displacement of the body. Returns the total displacement to
+        shift it by now, or None if the shift can be held back. `force` always
+        returns the total.
+        """
+        residual = self.residual[index]
+        residual += (dx, dy, dz)
+        self.age[index] += 1
+        x, y, z = residual.tolist()
+        if (
+            not force
+            and x * x + y * y + z * z < self.threshold * self.threshold
+            and self.age[index] < self.max_age
+        ):
+            self.saved[index] += 1
+            return None
+        residual[:] = 0
+        self.age[index] = 0
+        self.issued[index] += 1
+        return (x, y, z)
+
+    def pending(self) -> list[tuple[int, tuple[float, float, float]]]:
+        """ Take every displacement which hasn't been shifted yet. """
+        indexes = np.flatnonzero(self.residual.any(axis=1))
+        result = [(index, tuple(self.residual[index].tolist())) for index in indexes.tolist()]
+        self.clear()
+        return result
+
+    def reset_stats(self):
+        self.issued[:] = 0
+        self.saved[:] = 0
@@ -0,0 +1,369 @@
+""" Running the simulation in a separate process.
+
+Even on a worker thread the simulation competes for the GIL with every hook in
+the game's process. Here it runs in a process of its own instead, which steps
+the orbits at its own tick rate and publishes the positions of the bodies to a
+block of shared memory after every step. The game's hook only ever copies the
+latest positions out, so it never waits on the simulation.
+
+Time in the process follows the game's frame time rather than the wall clock:
+each frame the hook adds how much simulated time has passed to a running total
+in the shared block, and each tick the process steps by however much the total
+has grown since the last one. So the bodies stop when the game pauses or
+hitches, exactly as they do without the process.
+
+The positions and the running total are each guarded by a sequence number (a
+seqlock): their writer makes it odd before writing and even again after, and a
+reader which sees it odd, or sees it change while copying, tries again. Changes
+to the simulation (the time rate, which body is fixed, new orbits) are sent to
+the process over a queue.
+
+This module has no dependency on pymhf or nmspy as it is imported by the
+simulation process.
+"""
+
+from contextlib import contextmanager
+from multiprocessing import context, spawn
+from multiprocessing.shared_memory import SharedMemory
+import os.path as op
+import queue
+import sys
+import time
+from typing import Optional
+import weakref
+
+import numpy as np
+
+from ephemeris import EphemerisTable
+from kernels import warm_up
+from nbody import NBodyEngine, body_masses
+from orbits import OrbitEngine, orbitParams
+
+
+# Commands sent to the simulation process.
+# ("bodies", params, parents, times, integration_mode, settings): replace all
+# the orbits and body times. `settings` may hold "ephemeris" as
+# (budget, max_samples) and "nbody" as the arguments of `body_masses` after the
+# engine followed by the largest step.
+COMMAND_BODIES = "bodies"
+# ("rates", slowed, slowed_rate): the bodies slowed down to `slowed_rate` as the
+# player approaches.
+COMMAND_RATES = "rates"
+# ("fixed", fixed_index, fixed_chain, fixed_planet_position, fixed_position,
+# center): the body the player is on (or -1) and everything it orbits, where it
+# should appear to be and where it is, and the solar system center (None to
+# leave it to the process).
+COMMAND_FIXED = "fixed"
+COMMAND_STOP = "stop"
+
+# Layout of the shared block: the sequence number of the game's input and the
+# total simulated time (frame time scaled by the time rate) it has sent, then
+# the sequence number of the output, the step count, the index of the fixed
+# body and the solar system center, then the positions and times of the bodies.
+_INPUT_BYTES = 16
+_SEQ_BYTES = 8
+_HEADER = 5
+
+
+def _block_size(capacity: int) -> int:
+    return _INPUT_BYTES + _SEQ_BYTES + 8 * (_HEADER + 4 * capacity)
+
+
+class SharedPositions:
+    """ The positions of the bodies in a block of shared memory. """
+    def __init__(self, buffer, capacity: int):
+        self.capacity = capacity
+        self.input_seq = np.ndarray((1,), dtype=np.int64, buffer=buffer)
+        self.advanced = np.ndarray((1,), dtype=np.float64, buffer=buffer, offset=8)
+        self.seq = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=_INPUT_BYTES)
+        data = np.ndarray(
+            (_HEADER + 4 * capacity,),
+            dtype=np.float64,
+            buffer=buffer,
+            offset=_INPUT_BYTES + _SEQ_BYTES,
+        )
+        self.header = data[:_HEADER]
+        self.positions = data[_HEADER:_HEADER + 3 * capacity].reshape(capacity, 3)
+        self.times = data[_HEADER + 3 * capacity:]
+
+    def advance(self, delta: float):
+        """ Add simulated time for the process to step by. Only the game may
+        write this.
+        """
+        self.input_seq[0] += 1
+        self.advanced[0] += delta
+        self.input_seq[0] += 1
+
+    def read_advanced(self, retries: int = 8) -> Optional[float]:
+        """ The total simulated time added so far, or None if the game kept
+        writing it.
+        """
+        for _ in range(retries):
+            seq = int(self.input_seq[0])
+            if seq % 2:
+                continue
+            advanced = float(self.advanced[0])
+            if int(self.input_seq[0]) == seq:
+                return advanced
+        return None
+
+    def publish(self, positions: np.ndarray, fixed_index: int, center, times: np.ndarray):
+        """ Write a new step. Only one process may write. """
+        self.seq[0] += 1
+        self.header[0] += 1
+        self.header[1] = fixed_index
+        self.header[2:5] = center
+        self.positions[:] = positions
+        self.times[:] = times
+        self.seq[0] += 1
+
+
+class SimulationProcess:
+    """ Start, control and read the output of a simulation process. """
+    def __init__(self, capacity: int, tick_rate: float = 120.0, retries: int = 8):
+        self.capacity = capacity
+        # Steps per second the process runs at.
+        self.tick_rate = tick_rate
+        # How many times a read is retried if the process is writing.
+        self.retries = retries
+        self._shm: Optional[SharedMemory] = None
+        self._shared: Optional[SharedPositions] = None
+        self._process = None
+        self._commands = None
+        # Stops the process and frees the shared memory if this is dropped
+        # without being stopped, eg. when the mod is reloaded or the game exits.
+        self._finalizer: Optional[weakref.finalize] = None
+        self._last_seq = 0
+        # Local copy of the latest positions read, and what came with them.
+        self.positions = np.zeros((capacity, 3))
+        self.times = np.zeros(capacity)
+        self.fixed_index = -1
+        self.center = (0.0, 0.0, 0.0)
+        # Reads which gave up as the process kept writing.
+        self.torn_reads = 0
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    @property
+    def has_output(self) -> bool:
+        """ Whether a step has been read since the process started. """
+        return self._last_seq > 0
+
+    def start(self):
+        self._shm = SharedMemory(create=True, size=_block_size(self.capacity))
+        self._shared = SharedPositions(self._shm.buf, self.capacity)
+        self._shared.input_seq[0] = 0
+        self._shared.advanced[0] = 0
+        self._shared.seq[0] = 0
+        self._last_seq = 0
+        self._commands = _CONTEXT.Queue()
+        self._process = _CONTEXT.Process(
+            target=run_simulation,
+            args=(self._shm.name, self.capacity, self._commands, self.tick_rate),
+            name="newton-simulation",
+            daemon=True,
+        )
+        self._process.start()
+        self._finalizer = weakref.finalize(self, _release, self._process, self._commands, self._shm)
+
+    def stop(self, timeout: float = 2.0):
+        # Views of the block must go before it can be closed.
+        self._shared = None
+        if self._finalizer is not None and self._finalizer.detach():
+            _release(self._process, self._commands, self._shm, timeout)
+        self._finalizer = None
+        self._process = None
+        self._commands = None
+        self._shm = None
+
+    def send(self, *command):
+        self._commands.put(command)
+
+    def advance(self, delta: float):
+        """ Add simulated time to the next step of the process. """
+        if self._shared is not None:
+            self._shared.advance(delta)
+
+    def read(self) -> bool:
+        """ Copy out the latest step if there is a new one. Returns whether
+        there was.
+        """
+        shared = self._shared
+        if shared is None:
+            return False
+        for _ in range(self.retries):
+            seq = int(shared.seq[0])
+            if seq == self._last_seq:
+                return False
+            if seq % 2:
+                continue
+            np.copyto(self.positions, shared.positions)
+            np.copyto(self.times, shared.times)
+            fixed_index = int(shared.header[1])
+            center = tuple(shared.header[2:5].tolist())
+            if int(shared.seq[0]) == seq:
+                self._last_seq = seq
+                self.fixed_index = fixed_index
+                self.center = center
+                return True
+        self.torn_reads += 1
+        return False
+
+
+def _release(process, commands, shm: SharedMemory, timeout: float = 2.0):
+    """ Stop the simulation process and free its shared memory. """
+    commands.put((COMMAND_STOP,))
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+    commands.close()
+    shm.close()
+    shm.unlink()
+
+
+@contextmanager
+def _executable(path: str):
+    """ Start spawned processes with the given interpreter until the block ends.
+    multiprocessing only has the one setting for every context, so it is put
+    back afterwards rather than left changed for anything else in the game.
+    """
+    previous = spawn.get_executable()
+    spawn.set_executable(path)
+    try:
+        yield
+    finally:
+        spawn.set_executable(previous)
+
+
+class _SimulationProcess(context.SpawnProcess):
+    @staticmethod
+    def _Popen(process_obj):
+        # When running inside the game, sys.executable is the game.
+        with _executable(python_executable()):
+            return context.SpawnProcess._Popen(process_obj)
+
+
+class _SimulationContext(context.SpawnContext):
+    """ A spawn context of our own which starts the processes with
+    `python_executable` without changing how anything else starts them.
+    """
+    Process = _SimulationProcess
+
+
+_CONTEXT = _SimulationContext()
+
+
+def python_executable() -> str:
+    """ The Python interpreter to start the simulation process with. """
+    if op.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    if sys.platform == "win32":
+        return op.join(sys.exec_prefix, "python.exe")
+    return op.join(sys.exec_prefix, "bin", "python3")
+
+
+class _Simulation:
+    """ The state of the simulation within the simulation process. """
+    def __init__(self, capacity: int):
+        self.engine = OrbitEngine(capacity)
+        self.nbody: Optional[NBodyEngine] = None
+        # Simulated time sent by the game which hasn't been stepped yet, and
+        # the total sent up to the last tick.
+        self.pending = 0.0
+        self.advanced = 0.0
+        self.slowed: list[int] = []
+        self.slowed_rate = 1.0
+        self.fixed_index = -1
+        self.fixed_chain: list[int] = []
+        self.fixed_planet_position = np.zeros(3)
+        self.fixed_position: Optional[tuple[float, float, float]] = None
+        self.center = np.zeros(3)
+
+    def handle(self, command: tuple) -> bool:
+        """ Apply a command. Returns False once told to stop. """
+        kind, *args = command
+        if kind == COMMAND_STOP:
+            return False
+        if kind == COMMAND_BODIES:
+            params, parents, times, integration_mode, settings = args
+            engine = self.engine
+            engine.clear()
+            engine.integration_mode = integration_mode
+            for index, (orb_params, parent) in enumerate(zip(params, parents)):
+                if orb_params is not None:
+                    engine.set_body(index, orbitParams(*orb_params), parent)
+            engine.set_times(times)
+            if (ephemeris := settings.get("ephemeris")) is not None:
+                engine.ephemeris = EphemerisTable.build(engine, *ephemeris)
+            self.nbody = None
+            if (nbody := settings.get("nbody")) is not None:
+                *mass_settings, max_step = nbody
+                mu, unbound = body_masses(engine, *mass_settings)
+                self.nbody = NBodyEngine.from_orbit_engine(engine, mass_settings[0], mu, unbound, max_step=max_step)
+        elif kind == COMMAND_RATES:
+            self.slowed, self.slowed_rate = args
+        elif kind == COMMAND_FIXED:
+            self.fixed_index, self.fixed_chain, fixed_planet_position, self.fixed_position, center = args
+            self.fixed_planet_position[:] = fixed_planet_position
+            if center is not None:
+                self.center[:] = center
+        return True
+
+    def step(self) -> np.ndarray:
+        """ Advance by the time sent since the last step and return the new
+        positions. This follows `Newton._prepare_step` and `Newton._run_step`.
+        """
+        engine = self.engine
+        delta, self.pending = self.pending, 0.0
+        engine.rates[:] = 1
+        if self.nbody is not None:
+            if self.slowed:
+                delta *= self.slowed_rate
+            engine.advance(delta)
+            self.nbody.step(delta)
+            positions = self.nbody.relative_positions()
+            if self.fixed_index != -1 and self.fixed_index in self.nbody.moved_indexes:
+                self.center[:] = self.fixed_planet_position - positions[self.fixed_index]
+            return self.nbody.positions_around(self.center)
+        if self.fixed_index != -1:
+            # Move the solar system center so the body we are on stays put.
+            offset = np.zeros(3)
+            for index in self.fixed_chain:
+                offset += engine.offset_at(index, engine.times[index] + delta)
+            self.center[:] = self.fixed_planet_position - offset
+        elif self.slowed:
+            engine.rates[self.slowed] = self.slowed_rate
+        engine.advance(delta)
+        return engine.evaluate(self.center, self.fixed_index, self.fixed_position)
+
+
+def run_simulation(shm_name: str, capacity: int, commands, tick_rate: float):
+    """ Entry point of the simulation process. """
+    shm = SharedMemory(name=shm_name)
+    shared = SharedPositions(shm.buf, capacity)
+    simulation = _Simulation(capacity)
+    # Compile the kernels before the first tick.
+    warm_up()
+    tick = 1 / tick_rate
+    running = True
+    while running:
+        # Apply any changes before the next step.
+        while running:
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                break
+            running = simulation.handle(command)
+        advanced = shared.read_advanced()
+        if advanced is not None:
+            simulation.pending += advanced - simulation.advanced
+            simulation.advanced = advanced
+        now = time.perf_counter()
+        positions = simulation.step()
+        shared.publish(positions, simulation.fixed_index, simulation.center, simulation.engine.times)
+        time.sleep(max(0.0, tick - (time.perf_counter() - now)))
+    del shared
+    shm.close()
+
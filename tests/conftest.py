@@ -0,0 +1,39 @@
+import os.path as op
+import random
+import sys
+from typing import Optional
+
+import pytest
+
+# The mod is a set of flat modules in the repository root.
+sys.path.insert(0, op.dirname(op.dirname(op.abspath(__file__))))
+
+from generation import NewtonGlobals, default_globals, generate_orbit_params  # noqa: E402
+from orbits import OrbitEngine  # noqa: E402
+
+
+def build_system(
+    n_planets: int,
+    n_moons: int,
+    seed: int = 0,
+    newton_globals: Optional[NewtonGlobals] = None,
+    **engine_kwargs,
+) -> OrbitEngine:
+    """ Build an orbit engine of generated orbits, with the moons spread
+    round-robin among the planets.
+    """
+    rng = random.Random(seed)
+    newton_globals = newton_globals or default_globals()
+    engine = OrbitEngine(n_planets + n_moons, **engine_kwargs)
+    for i in range(n_planets):
+        engine.set_body(i, generate_orbit_params(rng.getrandbits(64), i, False, newton_globals), -1)
+    for i in range(n_moons):
+        index = n_planets + i
+        params = generate_orbit_params(rng.getrandbits(64), index, True, newton_globals, rng.uniform(20000, 60000))
+        engine.set_body(index, params, i % n_planets)
+    return engine
+
+
+@pytest.fixture
+def make_system():
+    return build_system
@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+import pytest
+
+from ephemeris import BYTES_PER_SAMPLE, EphemerisTable, allocate_samples
+from kernels import HAS_NUMBA
+from orbits import INTEGRATION_CLOSED_FORM, INTEGRATION_KEPLERIAN
+
+
+BUDGET = 1 << 20
+
+
+def direct_offsets(engine, times):
+    """ The in-plane offsets of every body straight from the orbit model. """
+    engine.ephemeris = None
+    engine.times[:] = times
+    engine._invalidate()
+    engine._compute_plane_offsets()
+    return engine._offsets.copy()
+
+
+@pytest.mark.parametrize("mode", [INTEGRATION_CLOSED_FORM, INTEGRATION_KEPLERIAN])
+def test_error_bound(make_system, mode):
+    engine = make_system(6, 12, integration_mode=mode)
+    table = EphemerisTable.build(engine, BUDGET, max_samples=256)
+    assert table is not None
+    assert table.nbytes <= BUDGET
+    rng = np.random.default_rng(1)
+    active = engine.body_indexes
+    # The error of a cubic Hermite interpolant is at most h^4 / 384 times the
+    # largest fourth derivative, which is a * alpha^4 for the closed form and
+    # larger by up to ((1 + e) / (1 - e))^4 near periapsis with Kepler's law.
+    # float32 coefficients add a relative error of about 1e-7.
+    angle = math.tau / table.count[active]
+    speedup = ((1 + engine.e[active]) / (1 - engine.e[active])) ** 4 if mode == INTEGRATION_KEPLERIAN else 1
+    bound = engine.a[active] * (speedup * angle ** 4 / 384 + 1e-6)
+    for _ in range(20):
+        times = rng.uniform(0, 10 * engine.periods.max(), engine.capacity)
+        expected = direct_offsets(engine, times)
+        actual = np.zeros_like(expected)
+        table.evaluate(times, actual)
+        error = np.linalg.norm(actual - expected, axis=1)[active]
+        assert (error <= bound).all()
+
+
+@pytest.mark.skipif(not HAS_NUMBA, reason="numba is not installed")
+def test_kernel_matches_numpy(make_system):
+    engine = make_system(6, 12)
+    table = EphemerisTable.build(engine, BUDGET)
+    period = np.where(table.period > 0, table.period, 1)
+    for times in (
+        np.random.default_rng(2).uniform(0, 1e6, engine.capacity),
+        np.zeros(engine.capacity),
+        # Rounding puts these exactly at the end of the orbit.
+        period * (1 - 1e-17),
+    ):
+        with_kernel = np.zeros((engine.capacity, 3))
+        without_kernel = np.zeros((engine.capacity, 3))
+        table.evaluate(times, with_kernel, use_kernels=True)
+        table.evaluate(times, without_kernel, use_kernels=False)
+        np.testing.assert_allclose(with_kernel, without_kernel, rtol=1e-6, atol=1e-3)
+
+
+def test_end_of_orbit_is_continuous(make_system):
+    engine = make_system(6, 12)
+    table = EphemerisTable.build(engine, BUDGET)
+    active = engine.body_indexes
+    start = np.zeros((engine.capacity, 3))
+    end = np.zeros((engine.capacity, 3))
+    table.evaluate(np.zeros(engine.capacity), start)
+    table.evaluate(table.period * (1 - 1e-17), end)
+    np.testing.assert_allclose(end[active], start[active], rtol=1e-6, atol=1e-3)
+
+
+def test_allocate_samples_respects_budget():
+    periods = np.array([10.0, 100.0, 1000.0, 10000.0])
+    counts = allocate_samples(periods, 4096, max_samples=1024, min_samples=16)
+    assert counts is not None
+    assert (counts >= 16).all() and (counts <= 1024).all()
+    # Including the zero sample at the start of the table.
+    assert BYTES_PER_SAMPLE * (counts.sum() + 1) <= 4096
+    assert allocate_samples(periods, 256, max_samples=1024, min_samples=16) is None
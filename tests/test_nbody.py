@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from generation import default_globals
+from nbody import NBodyEngine, body_masses
+from orbits import STAR_MU
+
+
+def default_nbody(engine):
+    newton_globals = default_globals()
+    mu, unbound = body_masses(
+        engine,
+        STAR_MU,
+        STAR_MU * newton_globals.nbody_planet_mass_ratio,
+        STAR_MU * newton_globals.nbody_moon_mass_ratio,
+        newton_globals.nbody_hill_fraction,
+        newton_globals.nbody_max_mass_ratio,
+    )
+    nbody = NBodyEngine.from_orbit_engine(engine, STAR_MU, mu, unbound, max_step=newton_globals.nbody_max_step)
+    return nbody, unbound
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_energy_drift(make_system, seed):
+    # With the default spacing neighbouring planets can pass close enough to
+    # fling moons out, which no fixed step integrator conserves energy
+    # through, so the planets are spread out to test the integrator alone.
+    newton_globals = default_globals()
+    newton_globals.avg_planet_separation = 1e6
+    engine = make_system(6, 6, seed=seed, newton_globals=newton_globals)
+    nbody, _ = default_nbody(engine)
+    initial = nbody.energy()
+    # A simulated hour, in substeps of the largest step.
+    for _ in range(60):
+        nbody.step(60.0)
+    assert abs(nbody.energy() - initial) < 1e-6 * abs(initial)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_every_body_is_placed(make_system, seed):
+    engine = make_system(6, 12, seed=seed)
+    nbody, unbound = default_nbody(engine)
+    assert nbody is not None
+    assert sorted(nbody.moved_indexes.tolist()) == sorted(engine.body_indexes.tolist())
+    assert set(unbound) <= set(nbody.followers.tolist())
+
+
+def test_followers_track_their_orbits(make_system):
+    engine = make_system(6, 12)
+    nbody, _ = default_nbody(engine)
+    assert len(nbody.followers)
+    for _ in range(10):
+        engine.advance(1.0)
+        nbody.step(1.0)
+    positions = nbody.relative_positions()
+    for index in nbody.followers.tolist():
+        offset = positions[index] - positions[engine.parent[index]]
+        np.testing.assert_allclose(offset, engine.offset_at(index, engine.times[index]))
+
+
+def test_positions_around_leaves_relative_positions(make_system):
+    engine = make_system(6, 6)
+    nbody, _ = default_nbody(engine)
+    relative = nbody.relative_positions().copy()
+    center = np.array([1e6, -2e6, 3e6])
+    absolute = nbody.positions_around(center)
+    np.testing.assert_array_equal(nbody.positions, relative)
+    np.testing.assert_allclose(absolute[nbody.moved_indexes], relative[nbody.moved_indexes] + center)
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+
+from generation import default_globals, format_period, generate_orbit_params
+from orbit_cache import OrbitCache, orbit_cache_key
+
+
+def cached_orbit(seed: int, index: int = 0, parent_radius=None):
+    newton_globals = default_globals()
+    is_moon = parent_radius is not None
+    params = generate_orbit_params(seed, index, is_moon, newton_globals, parent_radius)
+    key = orbit_cache_key(seed, newton_globals, index, 0 if is_moon else -1, parent_radius)
+    return key, params, format_period(2 * np.pi / params.alpha)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "orbits.bin")
+    cache = OrbitCache(path)
+    entries = [cached_orbit(seed, seed % 5) for seed in range(50)]
+    entries += [cached_orbit(seed, 1, float(np.float32(31415.9))) for seed in range(50, 60)]
+    for key, params, period in entries:
+        cache.put(key, params, period)
+    cache.save()
+    assert os.path.getsize(path) == cache.nbytes
+
+    loaded = OrbitCache(path)
+    loaded.load()
+    assert len(loaded) == len(entries)
+    for key, params, period in entries:
+        # Every value goes through the file as a double, so is exact.
+        assert loaded.get(key) == (params, period)
+    assert loaded.misses == 0
+
+
+def test_keys_depend_on_generation_inputs():
+    newton_globals = default_globals()
+    key = orbit_cache_key(1, newton_globals, 0, -1, None)
+    assert orbit_cache_key(1, newton_globals, 1, -1, None) != key
+    assert orbit_cache_key(1, newton_globals, 0, 0, 30000.0) != key
+    # Simulation settings don't change the orbits.
+    newton_globals.nbody_max_step *= 2
+    assert orbit_cache_key(1, newton_globals, 0, -1, None) == key
+    newton_globals.avg_planet_separation *= 2
+    assert orbit_cache_key(1, newton_globals, 0, -1, None) != key
+
+
+def test_least_recently_used_are_dropped(tmp_path):
+    path = str(tmp_path / "orbits.bin")
+    cache = OrbitCache(path, max_entries=3)
+    entries = [cached_orbit(seed) for seed in range(4)]
+    for key, params, period in entries[:3]:
+        cache.put(key, params, period)
+    # Using the oldest entry keeps it over the second.
+    assert cache.get(entries[0][0]) is not None
+    cache.put(*entries[3])
+    assert cache.get(entries[1][0]) is None
+    cache.save()
+
+    loaded = OrbitCache(path, max_entries=2)
+    loaded.load()
+    # The order is kept through the file, so lowering the cap drops the oldest.
+    assert loaded.get(entries[2][0]) is None
+    assert loaded.get(entries[0][0]) is not None
+    assert loaded.get(entries[3][0]) is not None
+
+
+def test_unreadable_files_are_ignored(tmp_path):
+    path = tmp_path / "orbits.bin"
+    cache = OrbitCache(str(path))
+    cache.load()
+    assert len(cache) == 0
+    key, params, period = cached_orbit(1)
+    cache.put(key, params, period)
+    cache.save()
+    path.write_bytes(path.read_bytes()[:-10])
+    cache.load()
+    assert len(cache) == 0
+    path.write_bytes(b"XXXX" + bytes(8))
+    cache.load()
+    assert len(cache) == 0
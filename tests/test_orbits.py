@@ -0,0 +1,93 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from orbits import (
+    INTEGRATION_CLOSED_FORM,
+    INTEGRATION_INCREMENTAL,
+    INTEGRATION_KEPLERIAN,
+    INTEGRATION_MODES,
+    sample_orbits,
+)
+
+
+CENTER = np.zeros(3)
+
+
+def test_incremental_matches_closed_form(make_system):
+    closed = make_system(6, 12, integration_mode=INTEGRATION_CLOSED_FORM)
+    incremental = make_system(6, 12, integration_mode=INTEGRATION_INCREMENTAL)
+    rng = np.random.default_rng(0)
+    for frame in range(20000):
+        # Uneven frames, with some bodies slowed down part of the time.
+        delta = rng.uniform(0.5, 2) / 60
+        for engine in (closed, incremental):
+            engine.rates[:] = 0.25 if frame % 1000 < 200 else 1
+            engine.advance(delta)
+    np.testing.assert_allclose(incremental.times, closed.times)
+    error = np.linalg.norm(incremental.evaluate(CENTER) - closed.evaluate(CENTER), axis=1)
+    assert error.max() < 1e-6 * closed.a.max()
+
+
+@pytest.mark.parametrize("mode", INTEGRATION_MODES)
+def test_kernels_match_numpy(make_system, mode):
+    with_kernels = make_system(6, 12, integration_mode=mode)
+    without_kernels = make_system(6, 12, integration_mode=mode)
+    without_kernels.use_kernels = False
+    for engine in (with_kernels, without_kernels):
+        engine.advance(1234.5)
+    np.testing.assert_allclose(with_kernels.evaluate(CENTER), without_kernels.evaluate(CENTER), rtol=1e-12, atol=1e-6)
+
+
+@pytest.mark.parametrize("mode", INTEGRATION_MODES)
+def test_offsets_match_samples(make_system, mode):
+    engine = make_system(6, 12, integration_mode=mode)
+    engine.advance(5000.0)
+    engine.compute_offsets()
+    index = engine.body_indexes
+    pos, _ = sample_orbits(
+        mode,
+        engine.a[index],
+        engine.b[index],
+        engine.alpha[index],
+        engine.delta[index],
+        engine.e[index],
+        engine.times[index],
+    )
+    expected = np.einsum("nij,nj->ni", engine.orientation[index], pos)
+    np.testing.assert_allclose(engine._offsets[index], expected, atol=1e-6)
+    for i in index.tolist():
+        np.testing.assert_allclose(engine.offset_at(i, engine.times[i]), engine._offsets[i], atol=1e-6)
+
+
+@pytest.mark.parametrize("before, after", list(itertools.permutations(INTEGRATION_MODES, 2)))
+def test_switching_mode_keeps_positions(make_system, before, after):
+    engine = make_system(6, 12, integration_mode=before)
+    engine.advance(4321.0)
+    expected = engine.evaluate(CENTER).copy()
+    engine.set_integration_mode(after)
+    assert engine.integration_mode == after
+    np.testing.assert_allclose(engine.evaluate(CENTER), expected, atol=1e-6)
+    engine.set_integration_mode(before)
+    np.testing.assert_allclose(engine.evaluate(CENTER), expected, atol=1e-6)
+
+
+def test_keplerian_sweeps_equal_areas(make_system):
+    engine = make_system(1, 0, integration_mode=INTEGRATION_KEPLERIAN)
+    period = engine.periods[0]
+    t = np.linspace(0, period, 4097)
+    n = len(t)
+    pos, vel = sample_orbits(
+        INTEGRATION_KEPLERIAN,
+        np.full(n, engine.a[0]),
+        np.full(n, engine.b[0]),
+        np.full(n, engine.alpha[0]),
+        np.full(n, engine.delta[0]),
+        np.full(n, engine.e[0]),
+        t,
+    )
+    # Angular momentum about the focus at (a * e, 0) is constant.
+    focus_x = pos[:, 0] - engine.a[0] * engine.e[0]
+    momentum = focus_x * vel[:, 1] - pos[:, 1] * vel[:, 0]
+    np.testing.assert_allclose(momentum, momentum[0], rtol=1e-9)
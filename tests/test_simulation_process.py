@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+
+from orbits import INTEGRATION_CLOSED_FORM, OrbitEngine, orbitParams
+from simulation_process import COMMAND_BODIES, SharedPositions, SimulationProcess, _block_size
+
+
+CAPACITY = 4
+
+
+def attached_process() -> tuple[SimulationProcess, SharedPositions]:
+    """ A reader and a writer sharing a block, without starting a process. """
+    buffer = bytearray(_block_size(CAPACITY))
+    process = SimulationProcess(CAPACITY)
+    process._shared = SharedPositions(memoryview(buffer), CAPACITY)
+    return process, SharedPositions(memoryview(buffer), CAPACITY)
+
+
+def test_read_copies_published_step():
+    process, shared = attached_process()
+    assert not process.read()
+    positions = np.arange(3 * CAPACITY, dtype=float).reshape(CAPACITY, 3)
+    times = np.array([1.0, 2.0, 3.0, 4.0])
+    shared.publish(positions, 2, (7.0, 8.0, 9.0), times)
+    assert process.read()
+    assert process.has_output
+    np.testing.assert_array_equal(process.positions, positions)
+    np.testing.assert_array_equal(process.times, times)
+    assert process.fixed_index == 2
+    assert process.center == (7.0, 8.0, 9.0)
+    # Nothing new until the next step.
+    assert not process.read()
+    shared.publish(positions + 1, -1, (0.0, 0.0, 0.0), times)
+    assert process.read()
+    np.testing.assert_array_equal(process.positions, positions + 1)
+
+
+def test_read_gives_up_while_writing():
+    process, shared = attached_process()
+    shared.publish(np.ones((CAPACITY, 3)), -1, (0.0, 0.0, 0.0), np.zeros(CAPACITY))
+    assert process.read()
+    # Half way through the next write.
+    shared.seq[0] += 1
+    shared.positions[:] = 2
+    assert not process.read()
+    assert process.torn_reads == 1
+    np.testing.assert_array_equal(process.positions, 1)
+    shared.seq[0] += 1
+    assert process.read()
+    np.testing.assert_array_equal(process.positions, 2)
+
+
+def test_advanced_time_accumulates():
+    process, shared = attached_process()
+    assert shared.read_advanced() == 0
+    for _ in range(10):
+        process.advance(0.25)
+    assert shared.read_advanced() == 2.5
+    shared.input_seq[0] += 1
+    assert shared.read_advanced() is None
+
+
+def test_process_steps_by_the_time_sent():
+    params = [orbitParams(1e5 * (i + 1), 9e4 * (i + 1), 1e-3 / (i + 1), 0.5 * i, 0.0, 0.0) for i in range(CAPACITY)]
+    process = SimulationProcess(CAPACITY)
+    process.start()
+    try:
+        process.send(
+            COMMAND_BODIES,
+            [tuple(orbit) for orbit in params],
+            [-1] * CAPACITY,
+            [0.0] * CAPACITY,
+            INTEGRATION_CLOSED_FORM,
+            {},
+        )
+        for _ in range(10):
+            process.advance(1.5)
+        # The process has to start up and compile the kernels first.
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            process.read()
+            if process.has_output and process.times[0] == 15:
+                break
+            time.sleep(0.05)
+    finally:
+        process.stop()
+    np.testing.assert_allclose(process.times, 15)
+    expected = OrbitEngine(CAPACITY)
+    for index, orbit in enumerate(params):
+        expected.set_body(index, orbit, -1)
+    expected.set_times(process.times)
+    np.testing.assert_allclose(process.positions, expected.evaluate(np.zeros(3)))
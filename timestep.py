@@ -0,0 +1,88 @@
+""" Fixed timestep simulation helpers for Newton.
+
+Rather than advancing the simulation by the (variable) length of each frame,
+frame time is accumulated and released in fixed ticks. The positions written to
+the game are interpolated between the last two ticks so that motion stays
+smooth even when the simulation runs at a much lower rate than the game.
+"""
+
+import numpy as np
+
+from orbits import grow_array
+
+
+class FixedTimestep:
+    """ Accumulate frame time and release it in ticks of a fixed length. """
+    def __init__(self, tick_rate: float = 20.0, max_ticks_per_frame: int = 5):
+        self.tick = 1 / tick_rate
+        # After a hitch, at most this many ticks are run in a single frame and
+        # the rest of the time is dropped rather than causing a bigger hitch.
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self.accumulator = 0.0
+        self.dropped_time = 0.0
+
+    def add(self, frame_time: float) -> int:
+        """ Add the length of a frame and return how many ticks to run. """
+        self.accumulator += frame_time
+        ticks = int(self.accumulator // self.tick)
+        if ticks > self.max_ticks_per_frame:
+            self.dropped_time += (ticks - self.max_ticks_per_frame) * self.tick
+            self.accumulator -= (ticks - self.max_ticks_per_frame) * self.tick
+            ticks = self.max_ticks_per_frame
+        self.accumulator -= ticks * self.tick
+        return ticks
+
+    @property
+    def alpha(self) -> float:
+        """ How far through the current tick we are, between 0 and 1. """
+        return min(self.accumulator / self.tick, 1.0)
+
+    def reset(self):
+        self.accumulator = 0.0
+
+    def summary(self) -> str:
+        return f"Dropped {self.dropped_time:.2f}s of simulation time after hitches"
+
+
+class PositionInterpolator:
+    """ Keep the positions of the last two ticks and blend between them. """
+    def __init__(self, capacity: int = 8):
+        self.previous = np.zeros((capacity, 3))
+        self.current = np.zeros((capacity, 3))
+        self.blended = np.zeros((capacity, 3))
+        self._ticks = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._ticks > 0
+
+    def push(self, positions: np.ndarray):
+        """ Record the positions of a new tick. """
+        if self._ticks == 0:
+            # Nothing to interpolate from yet, so start from rest.
+            np.copyto(self.previous, positions)
+        else:
+            self.previous, self.current = self.current, self.previous
+        np.copyto(self.current, positions)
+        self._ticks += 1
+
+    def blend(self, alpha: float) -> np.ndarray:
+        """ Return the positions `alpha` of the way from the previous tick to
+        the current one.
+        """
+        np.subtract(self.current, self.previous, out=self.blended)
+        self.blended *= alpha
+        self.blended += self.previous
+        return self.blended
+
+    def grow(self, capacity: int):
+        """ Make room for `capacity` bodies, keeping the recorded ticks. """
+        if capacity <= len(self.current):
+            return
+        self.previous = grow_array(self.previous, capacity)
+        self.current = grow_array(self.current, capacity)
+        self.blended = grow_array(self.blended, capacity)
+
+    def reset(self):
+        """ Forget the previous ticks, eg. when bodies are added or removed. """
+        self._ticks = 0
@@ -0,0 +1,111 @@
+""" Flat plans for moving the bodies of a system each frame.
+
+Which body stays still, which bodies are slowed down and what each body is
+placed around only change when the player enters or leaves an orbit, the
+nearest body changes or the body tree changes. Rather than working this out
+again every frame it is compiled into a plan for each such state, and each
+frame just runs through the steps of the plan.
+"""
+
+from collections import namedtuple
+
+
+# Ways in which the time of a body advances. The values index the per-frame
+# tuple of rates, eg. `(1, time_modifier(focus))[step.rate]`.
+# At the full rate.
+RATE_FULL = 0
+# At the approach rate of the nearest body, as it and everything it orbits are
+# slowed down together.
+RATE_APPROACH = 1
+
+# What a body is placed around. Any other value is the index of the body it
+# orbits, which is always placed by an earlier step.
+# The solar system center.
+CENTER_STAR = -1
+# Nothing, as the body is the one the player is in the orbit of and stays
+# where it is.
+CENTER_FIXED = -2
+
+planStep = namedtuple("planStep", ["index", "center", "rate"])
+
+
+class UpdatePlan:
+    """ The steps to move every body for one state of the system. """
+    def __init__(
+        self,
+        in_orbit: bool,
+        focus: int,
+        fixed_index: int,
+        fixed_chain: list[int],
+        slowed: list[int],
+        steps: list[planStep],
+    ):
+        # The state the plan was compiled for.
+        self.in_orbit = in_orbit
+        self.focus = focus
+        # The body which isn't moved (or -1), and it along with everything it
+        # orbits, outermost first.
+        self.fixed_index = fixed_index
+        self.fixed_chain = fixed_chain
+        # The bodies which run at the approach rate of the focus body.
+        self.slowed = slowed
+        self.steps = steps
+
+    def matches(self, in_orbit: bool, focus: int) -> bool:
+        return self.in_orbit == in_orbit and self.focus == focus
+
+    def __repr__(self):
+        return (
+            f"UpdatePlan(in_orbit={self.in_orbit}, focus={self.focus}, "
+            f"fixed={self.fixed_index}, slowed={self.slowed}, steps={len(self.steps)})"
+        )
+
+
+def compile_update_plan(
+    in_orbit: bool,
+    focus: int,
+    parent_map: list[int],
+    order: list[int],
+) -> UpdatePlan:
+    """ Compile the plan for moving the bodies in `order` (where every body
+    comes after the one it orbits) when `focus` is the nearest body (or -1).
+
+    If the player is in the orbit of the focus body it stays where it is and
+    everything else moves at the full rate. Otherwise the focus body and
+    everything it orbits are slowed down. Bodies which orbit a body that isn't
+    in `order` can't be placed so are left out.
+    """
+    chain = []
+    if focus != -1:
+        index = focus
+        while index != -1 and index not in chain and len(chain) < len(parent_map):
+            chain.append(index)
+            index = parent_map[index]
+    chain.reverse()
+
+    fixed_index = focus if in_orbit else -1
+    slowed = [] if in_orbit else chain
+    slowed_set = set(slowed)
+    placed = set()
+    steps = []
+    for index in order:
+        parent = parent_map[index]
+        if index == fixed_index:
+            center = CENTER_FIXED
+        elif parent == -1:
+            center = CENTER_STAR
+        elif parent in placed:
+            center = parent
+        else:
+            continue
+        placed.add(index)
+        rate = RATE_APPROACH if index in slowed_set else RATE_FULL
+        steps.append(planStep(index, center, rate))
+    return UpdatePlan(
+        in_orbit,
+        focus,
+        fixed_index,
+        chain if fixed_index != -1 else [],
+        slowed,
+        steps,
+    )
@@ -0,0 +1,90 @@
+""" Cheap tests of which bodies the player can currently see.
+
+The tests only use the simulation's own positions, so they don't need to read
+anything from the game besides where the player is and which way they face.
+A body is hidden if it is out of view behind the player, further away than it
+is drawn, or completely hidden behind the body the player is on. The view is
+a cone around the direction the player faces which is wider than the camera,
+as the camera can be turned away from the player's facing.
+"""
+
+import math
+
+import numpy as np
+
+from occlusion import hidden_behind
+from orbits import grow_array
+
+
+class VisibilityTracker:
+    """ Track which bodies are visible from one frame to the next. """
+    def __init__(
+        self,
+        capacity: int = 8,
+        view_angle: float = math.radians(120),
+        draw_distance: float = math.inf,
+        gravity_interval: int = 10,
+    ):
+        # Half angle of the view cone around the player's facing.
+        self.view_angle = view_angle
+        # Bodies whose surface is further away than this aren't drawn.
+        self.draw_distance = draw_distance
+        # Hidden bodies have their gravity point moved every this many frames.
+        self.gravity_interval = gravity_interval
+        self.visible = np.ones(capacity, dtype=bool)
+        # Bodies which became visible this frame.
+        self.appeared = np.zeros(capacity, dtype=bool)
+        self.frame = 0
+
+    def grow(self, capacity: int):
+        """ Make room for `capacity` bodies, which start out visible. """
+        if capacity <= len(self.visible):
+            return
+        self.visible = grow_array(self.visible, capacity, True)
+        self.appeared = grow_array(self.appeared, capacity, False)
+
+    def reset(self):
+        self.visible[:] = True
+        self.appeared[:] = False
+
+    def update(
+        self,
+        viewer,
+        facing,
+        positions: np.ndarray,
+        radii: np.ndarray,
+        indexes: np.ndarray,
+        occluder: int = -1,
+        always: int = -1,
+    ):
+        """ Work out which of the bodies in `indexes` are visible from `viewer`
+        looking along `facing`. `occluder` is the body the viewer is on (or -1)
+        and the body `always` is always treated as visible.
+        """
+        self.frame += 1
+        offsets = positions[indexes] - viewer
+        dist = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+        body_radii = radii[indexes]
+        visible = dist - body_radii <= self.draw_distance
+        if facing is not None:
+            facing = np.asarray(facing, dtype=float)
+            facing = facing / np.linalg.norm(facing)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                angle = np.arccos(np.clip(offsets @ facing / dist, -1.0, 1.0))
+                angular_radii = np.arcsin(np.minimum(body_radii / dist, 1.0))
+            # Part of the body is within the view cone. A body around the viewer
+            # is always in view.
+            visible &= ~(angle - angular_radii > self.view_angle)
+        if occluder != -1:
+            visible &= ~hidden_behind(viewer, positions, radii, occluder)[indexes]
+        visible[indexes == always] = True
+        self.appeared[:] = False
+        self.appeared[indexes] = visible & ~self.visible[indexes]
+        self.visible[indexes] = visible
+
+    def gravity_due(self, indexes: np.ndarray) -> np.ndarray:
+        """ The hidden bodies in `indexes` whose gravity point should be moved
+        this frame. These are spread across frames by index.
+        """
+        hidden = indexes[~self.visible[indexes]]
+        return hidden[(hidden + self.frame) % self.gravity_interval == 0]